@@ -0,0 +1,281 @@
+"""
+Index de plus proches voisins approché (IVF) en NumPy
+Les vecteurs sont répartis en listes autour de centroïdes appris par
+k-means ; une recherche ne compare la question qu'aux vecteurs des
+`nprobe` listes les plus proches au lieu de tout le corpus.
+
+Réglage rappel / latence :
+    nprobe = nombre de listes explorées (KAIZEN_ANN_NPROBE)
+    nprobe petit → plus rapide, nprobe = n_lists → recherche exacte
+
+Persistance : un dossier de fichiers .npy relus en mmap. Les vecteurs y
+sont triés par liste, chaque liste est donc une tranche contiguë. Les
+ajouts incrémentaux vont dans un tampon par liste, fusionné au stockage
+principal par compact() (appelé par save()). `trained` garde le nombre de
+vecteurs sur lequel les centroïdes ont été appris : l'appelant décide d'un
+réentraînement quand l'index s'en écarte trop.
+"""
+
+import glob
+import os
+import shutil
+import time
+
+import numpy as np
+
+DEFAULT_NPROBE = int(os.environ.get('KAIZEN_ANN_NPROBE', 8))
+KMEANS_ITERATIONS = 15
+KMEANS_MAX_SAMPLES = 20000
+
+
+def default_list_count(vector_count):
+    """Nombre de listes conseillé : environ 4 × √N"""
+    return max(1, min(vector_count, int(4 * np.sqrt(vector_count))))
+
+
+def train_centroids(vectors, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    K-means sphérique (affectation par produit scalaire maximal)
+
+    Args:
+        vectors: Matrice (N, dim) de vecteurs normés
+
+    Returns:
+        np.ndarray: Centroïdes normés (n_lists, dim)
+    """
+    rng = np.random.default_rng(seed)
+    if len(vectors) > KMEANS_MAX_SAMPLES:
+        vectors = vectors[rng.choice(len(vectors), KMEANS_MAX_SAMPLES, replace=False)]
+    vectors = np.asarray(vectors, dtype=np.float32)
+
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_lists)
+
+        # Une liste vide repart d'un vecteur tiré au hasard
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Index IVF : centroïdes + listes inversées de vecteurs
+
+    Attributs du stockage principal :
+        vectors : (N, dim) triés par liste
+        ids     : (N,) identifiant associé à chaque ligne
+        offsets : (n_lists + 1,) la liste c occupe vectors[offsets[c]:offsets[c + 1]]
+        trained : nombre de vecteurs sur lequel les centroïdes ont été appris
+    """
+
+    def __init__(self, centroids, vectors=None, ids=None, offsets=None, trained=None):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        n_lists, dim = self.centroids.shape
+        self.vectors = vectors if vectors is not None else np.zeros((0, dim), dtype=np.float32)
+        self.ids = ids if ids is not None else np.zeros(0, dtype=np.int64)
+        self.offsets = offsets if offsets is not None else np.zeros(n_lists + 1, dtype=np.int64)
+        self.trained = int(trained) if trained is not None else len(self.ids)
+        self._pending = {}
+
+    @classmethod
+    def build(cls, vectors, ids=None, n_lists=None):
+        """Apprend les centroïdes sur `vectors` puis les ajoute à l'index"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n_lists = n_lists or default_list_count(len(vectors))
+        index = cls(train_centroids(vectors, n_lists), trained=len(vectors))
+        index.add(vectors, ids)
+        index.compact()
+        return index
+
+    def copy(self):
+        """
+        Index qui partage le stockage principal (lecture seule) : les ajouts
+        à la copie ne modifient pas l'original, qui peut continuer à servir
+        """
+        self.compact()
+        return IVFIndex(self.centroids, self.vectors, self.ids, self.offsets, self.trained)
+
+    def __len__(self):
+        pending = sum(len(part) for parts, _ in self._pending.values() for part in parts)
+        return len(self.ids) + pending
+
+    def add(self, vectors, ids=None):
+        """
+        Ajoute des vecteurs sans réentraîner les centroïdes
+
+        Args:
+            vectors: Matrice (n, dim) de vecteurs normés
+            ids: Identifiants (par défaut, à la suite des existants)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if ids is None:
+            ids = np.arange(len(self), len(self) + len(vectors))
+        ids = np.asarray(ids, dtype=np.int64)
+
+        assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+        for list_id in np.unique(assignments):
+            mask = assignments == list_id
+            pending_ids, pending_vectors = self._pending.get(int(list_id), ([], []))
+            pending_ids.append(ids[mask])
+            pending_vectors.append(vectors[mask])
+            self._pending[int(list_id)] = (pending_ids, pending_vectors)
+
+    def compact(self):
+        """Fusionne les ajouts en attente dans le stockage principal trié par liste"""
+        if not self._pending:
+            return
+
+        n_lists = len(self.centroids)
+        id_parts, vector_parts = [], []
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        for list_id in range(n_lists):
+            start, end = self.offsets[list_id], self.offsets[list_id + 1]
+            parts_ids = [self.ids[start:end]]
+            parts_vectors = [self.vectors[start:end]]
+            if list_id in self._pending:
+                pending_ids, pending_vectors = self._pending[list_id]
+                parts_ids.extend(pending_ids)
+                parts_vectors.extend(pending_vectors)
+            id_parts.extend(parts_ids)
+            vector_parts.extend(parts_vectors)
+            offsets[list_id + 1] = offsets[list_id] + sum(len(p) for p in parts_ids)
+
+        self.ids = np.concatenate(id_parts)
+        self.vectors = np.concatenate(vector_parts).astype(np.float32)
+        self.offsets = offsets
+        self._pending = {}
+
+    def search(self, query_vectors, k=5, nprobe=DEFAULT_NPROBE):
+        """
+        Plus proches voisins approchés
+
+        Args:
+            query_vectors: Matrice (q, dim) de questions encodées
+            k: Nombre de voisins par question
+            nprobe: Nombre de listes explorées (rappel / latence)
+
+        Returns:
+            list: Pour chaque question, [(identifiant, similarité)] triés
+        """
+        query_vectors = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        centroid_scores = query_vectors @ self.centroids.T
+        probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        results = []
+        for query, lists in zip(query_vectors, probes):
+            cand_ids, cand_vectors = [], []
+            for list_id in lists:
+                start, end = self.offsets[list_id], self.offsets[list_id + 1]
+                if end > start:
+                    cand_ids.append(self.ids[start:end])
+                    cand_vectors.append(self.vectors[start:end])
+                if int(list_id) in self._pending:
+                    pending_ids, pending_vectors = self._pending[int(list_id)]
+                    cand_ids.extend(pending_ids)
+                    cand_vectors.extend(pending_vectors)
+
+            if not cand_ids:
+                results.append([])
+                continue
+
+            ids = np.concatenate(cand_ids)
+            scores = np.concatenate(cand_vectors) @ query
+            top_k = min(k, len(scores))
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            top = top[np.argsort(-scores[top])]
+            results.append([(int(ids[i]), float(scores[i])) for i in top])
+
+        return results
+
+    def save(self, directory):
+        """
+        Enregistre l'index (dossier de fichiers .npy)
+
+        Chaque enregistrement écrit un dossier versionné à côté, puis
+        `directory` (un lien symbolique) est repointé dessus par os.replace,
+        atomique : un lecteur trouve toujours soit l'ancien index complet,
+        soit le nouveau. La version précédente est gardée pour les lecteurs
+        qui viennent de résoudre le lien ; les plus anciennes sont supprimées.
+        Sans liens symboliques (Windows), le dossier est renommé à la place
+        et un lecteur peut brièvement ne rien trouver (reconstruction).
+        """
+        self.compact()
+        version_dir = f"{directory}.v{time.time_ns():020d}-{os.getpid()}"
+        os.makedirs(version_dir)
+        for name in ('centroids', 'vectors', 'ids', 'offsets'):
+            np.save(os.path.join(version_dir, f"{name}.npy"), getattr(self, name))
+        np.save(os.path.join(version_dir, "trained.npy"), np.int64(self.trained))
+
+        link = f"{directory}.{os.getpid()}.link"
+        try:
+            if os.path.lexists(link):
+                os.remove(link)
+            os.symlink(os.path.basename(version_dir), link)
+        except (OSError, NotImplementedError):
+            old_dir = f"{directory}.{os.getpid()}.old"
+            if os.path.exists(directory):
+                os.replace(directory, old_dir)
+            os.replace(version_dir, directory)
+            shutil.rmtree(old_dir, ignore_errors=True)
+            return
+
+        previous = None
+        if os.path.islink(directory):
+            previous = os.path.join(os.path.dirname(directory), os.readlink(directory))
+        elif os.path.isdir(directory):
+            # Dossier réel (enregistré par une version précédente) :
+            # os.replace ne remplace pas un dossier par un lien
+            old_dir = f"{directory}.{os.getpid()}.old"
+            os.replace(directory, old_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        os.replace(link, directory)
+
+        # Versions antérieures à la précédente : plus aucun lecteur ne les
+        # atteint par le lien (les noms se trient dans l'ordre d'écriture)
+        oldest_kept = min(previous, version_dir) if previous else version_dir
+        for stale in glob.glob(glob.escape(directory) + ".v*"):
+            if stale < oldest_kept:
+                shutil.rmtree(stale, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Relit un index enregistré, en mmap
+
+        Returns:
+            IVFIndex ou None si le dossier est absent ou incomplet
+        """
+        # Lien résolu une fois : tous les fichiers viennent de la même version.
+        # Si cette version a été supprimée entre-temps (plusieurs
+        # enregistrements successifs), le lien a été repointé : on recommence.
+        target = os.path.realpath(directory)
+        while True:
+            try:
+                arrays = {
+                    name: np.load(os.path.join(target, f"{name}.npy"), mmap_mode='r')
+                    for name in ('centroids', 'vectors', 'ids', 'offsets')
+                }
+                try:
+                    arrays['trained'] = np.load(os.path.join(target, "trained.npy"))
+                except (OSError, ValueError):
+                    # Absent des index enregistrés avant son introduction
+                    if not os.path.isdir(target):
+                        raise
+                break
+            except (OSError, ValueError):
+                current = os.path.realpath(directory)
+                if current == target:
+                    return None
+                target = current
+        return cls(**arrays)
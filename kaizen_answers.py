@@ -0,0 +1,188 @@
+"""
+Recherche et synthèse des réponses de l'assistant Kaizen, sans interface
+Utilisé par l'application Streamlit (kaizen_assistant.py) et par l'API
+HTTP (kaizen_api.py) : les deux partagent le même corpus, le même index
+et le même cache de réponses dans un processus.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+import kaizen_index
+from kaizen_cache import get_query_cache
+from kaizen_concepts import get_concept_registry
+from kaizen_corpus import get_corpus
+from kaizen_history import HistoryStore
+from kaizen_metrics import increment, timed
+import kaizen_profiling
+from kaizen_summary import summarize
+
+
+# Réponse à une question avec l'état propre à cette requête : l'assistant
+# peut être partagé entre les threads (API), rien n'est gardé sur l'instance
+#   complete: False si l'index était encore en construction (réponse partielle)
+#   profile: chemin du profil enregistré (voir kaizen_profiling) ou None
+Answer = namedtuple('Answer', 'text pages complete profile', defaults=(True, None))
+
+
+class KaizenAssistant:
+    # Espace de noms des réponses dans le cache partagé
+    CACHE_NAME = 'kaizen_assistant'
+    
+    def __init__(self, user='default'):
+        # Corpus (manuel, documentation utilisateur...) partagé entre toutes
+        # les sessions du processus
+        self.corpus = get_corpus()
+        
+        # Journal des questions de l'utilisateur (ajout en fin de fichier)
+        self.history = HistoryStore(user)
+        if self.history.user == 'default':
+            self.history.import_legacy()
+    
+    def add_to_history(self, query, answer, pages):
+        self.history.append({
+            'timestamp': datetime.now().isoformat(),
+            'query': query,
+            'answer': answer,
+            'pages': pages
+        })
+    
+    def search_pages(self, query, ranking=kaizen_index.DEFAULT_RANKING):
+        return kaizen_index.search_passages(self.corpus.current, query, ranking=ranking, wait=False)
+    
+    def cache_variant(self, query, ranking):
+        """Paramètres qui changent la réponse, en plus de la question (clé du cache)"""
+        # Les réponses types dépendent aussi de la version de concepts.json
+        return f"{ranking}:{get_concept_registry().version}"
+    
+    @timed('answer')
+    def answer_query(self, query, ranking=kaizen_index.DEFAULT_RANKING, profile=False):
+        """
+        Recherche et synthèse d'une question, via le cache partagé des réponses
+        
+        Avec `profile` (ou KAIZEN_PROFILE=1), la question est recalculée sous
+        le profileur.
+        
+        Returns:
+            Answer: réponse, pages, index complet, chemin du profil
+        """
+        # Vérifie de temps en temps si un document du corpus a changé : la
+        # réindexation se fait en arrière-plan, la version courante répond
+        self.corpus.refresh()
+        content_hash = self.corpus.current.content_hash
+        
+        # Pendant la première indexation, la réponse ne porte que sur les
+        # pages déjà extraites : elle n'est pas mise en cache
+        complete = kaizen_index.index_ready(self.corpus.current)
+        
+        variant = self.cache_variant(query, ranking)
+        cache = get_query_cache(self.CACHE_NAME)
+        profile = profile or kaizen_profiling.PROFILE_ALL
+        cached = None if profile else cache.get(content_hash, query, variant)
+        increment('queries', cache='miss' if cached is None else 'hit')
+        if cached is not None:
+            answer, pages = cached
+            return Answer(answer, list(pages), complete)
+        
+        with kaizen_profiling.profiled(query, profile, ranking=ranking) as run:
+            results = self.search_pages(query, ranking)
+            answer, pages = self.synthesize_answer(query, results)
+        if complete:
+            cache.put(content_hash, query, (answer, pages), variant)
+        return Answer(answer, pages, complete, run.path if run else None)
+    
+    def detect_concepts(self, query):
+        """
+        Tous les concepts présents dans la question avec leur poids
+
+        Le dictionnaire de mots-clés (concepts.json) est compilé une seule
+        fois par processus en automate multi-motifs.
+        """
+        return get_concept_registry().match(query)
+    
+    @timed('detect_concept')
+    def detect_concept(self, query):
+        """Concept principal de la question (le plus fort poids) ou None"""
+        matches = self.detect_concepts(query)
+        return matches[0][0] if matches else None
+    
+    @timed('synthesize')
+    def synthesize_answer(self, query, page_results):
+        if not page_results:
+            return "❌ Aucune information trouvée dans le manuel pour cette question.\n\n💡 **Suggestion :** Essayez de reformuler ou créez un ticket Freshdesk pour une aide personnalisée.", []
+        
+        # Plusieurs passages peuvent venir de la même page (références 'Manuel p.42')
+        pages_found = list(dict.fromkeys(r['ref'] for r in page_results))
+        all_text = "\n\n".join([r['text'] for r in page_results])
+        
+        # Détection du concept
+        concept = self.detect_concept(query)
+        
+        # Réponse type du concept (concepts.json), sinon synthèse générique
+        answer = get_concept_registry().answer(concept) if concept else None
+        if answer is None:
+            answer = self._synthesize_generic_improved(all_text, query)
+        
+        return answer, pages_found
+    
+    def _synthesize_generic_improved(self, text, query):
+        """Synthèse générique : résumé extractif de tous les passages retrouvés"""
+        best_lines = summarize(text, query, limit=8)
+        
+        if best_lines:
+            synthesis = "**💡 Informations trouvées**\n\n"
+            for line in best_lines:
+                clean_line = ' '.join(line.split())
+                if len(clean_line) > 20:
+                    synthesis += f"• {clean_line}\n\n"
+            synthesis += "\n💡 Pour plus de précisions, créez un ticket Freshdesk."
+            return synthesis
+        else:
+            return "❌ Informations insuffisantes.\n\n💡 Créez un ticket Freshdesk pour une réponse détaillée."
+    
+    def create_freshdesk_ticket(self, query, answer, pages):
+        ticket = f"""🎫 TICKET FRESHDESK - Assistant Kaizen
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+📋 OBJET
+Question sur Kaizen
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🔍 QUESTION
+{query}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🤖 RÉPONSE IA
+{answer}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+📄 PAGES CONSULTÉES
+{', '.join(map(str, pages)) if pages else 'Aucune'}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+❌ RAISON
+Réponse insuffisante ou besoin de précisions
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+👤 INFORMATIONS
+• Date : {datetime.now().strftime('%d/%m/%Y %H:%M')}
+• Nom : [À compléter]
+• Email : [À compléter]
+• Agence : [À compléter]
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+💬 PRÉCISIONS
+[Ajoutez vos détails]
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+✅ Ticket généré automatiquement
+"""
+        return ticket
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+API HTTP/JSON de l'assistant Kaizen, sans interface Streamlit
+Pour l'intranet, le widget Freshdesk et tout appelant à fort volume : même
+corpus, même index et même synthèse que l'application, sans le coût des
+reruns et du websocket Streamlit.
+
+    GET  /search?q=...&limit=5&ranking=bm25f   passages les plus pertinents
+    POST /synthesize  {"query": "...", "ranking": "bm25f"}   (?profile=<jeton> : voir kaizen_profiling)
+    POST /ticket      {"query": "...", "answer": "...", "pages": [...]}
+    GET  /healthz, /readyz                     sondes (voir kaizen_warmup)
+    GET  /metrics                              mesures Prometheus (voir kaizen_metrics)
+
+Lancement (serveur asynchrone, un processus par worker ; les index sont
+relus en mmap depuis le cache disque et partagés entre workers) :
+    pip install fastapi uvicorn
+    uvicorn kaizen_api:app --host 0.0.0.0 --port 8000 --workers 4
+"""
+
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field
+
+import kaizen_index
+import kaizen_metrics
+import kaizen_profiling
+import kaizen_warmup
+from kaizen_answers import KaizenAssistant
+
+MAX_LIMIT = 50
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Préchauffage dans chaque worker ; /readyz est servi par l'API elle-même
+    kaizen_warmup.start(health_server=False)
+    yield
+
+
+app = FastAPI(title="Assistant Kaizen", version="1.0", lifespan=lifespan)
+
+# Assistant partagé par toutes les requêtes du worker (il ne garde aucun
+# état propre à une requête : answer_query() renvoie l'état de l'index et le
+# profil avec la réponse ; l'historique n'est pas alimenté par l'API)
+assistant = KaizenAssistant(user='api')
+
+
+class SynthesizeRequest(BaseModel):
+    query: str = Field(..., min_length=1, max_length=1000)
+    ranking: str = kaizen_index.DEFAULT_RANKING
+
+
+class TicketRequest(BaseModel):
+    query: str = Field(..., min_length=1, max_length=1000)
+    answer: Optional[str] = None
+    pages: Optional[List[str]] = None
+
+
+def _check_ranking(ranking):
+    if ranking not in kaizen_index.RANKING_MODES:
+        raise HTTPException(400, f"Mode de classement inconnu : {ranking}")
+
+
+# Les routes de calcul sont synchrones : FastAPI les exécute dans son pool
+# de threads, la boucle asynchrone reste libre pour les autres requêtes
+
+@app.get("/search")
+def search(
+    q: str = Query(..., min_length=1, max_length=1000),
+    limit: int = Query(5, ge=1, le=MAX_LIMIT),
+    ranking: str = kaizen_index.DEFAULT_RANKING,
+):
+    """
+    Passages les plus pertinents, avec leur référence ('Manuel p.42'), et
+    durée des étapes (search ; lexical, vector, fusion en mode hybride)
+    """
+    _check_ranking(ranking)
+    timings = {}
+    results = kaizen_index.search_passages(
+        assistant.corpus.current, q, limit=limit, ranking=ranking, timings=timings, wait=False
+    )
+    return {
+        'query': q,
+        'ranking': ranking,
+        'complete': kaizen_index.index_ready(assistant.corpus.current),
+        'timings_ms': {stage[:-3]: round(ms, 3) for stage, ms in timings.items()},
+        'results': [
+            {key: r[key] for key in ('doc', 'page', 'ref', 'score', 'text', 'line')}
+            for r in results
+        ],
+    }
+
+
+@app.post("/synthesize")
+def synthesize(request: SynthesizeRequest, profile: Optional[str] = None):
+    """
+    Réponse synthétisée (réponse type du concept ou synthèse générique)
+
+    Avec ?profile=<KAIZEN_PROFILE_TOKEN>, la question est recalculée sous le
+    profileur et la réponse indique le fichier du profil.
+    """
+    _check_ranking(request.ranking)
+    profile = kaizen_profiling.requested(profile)
+    result = assistant.answer_query(request.query, request.ranking, profile=profile)
+    response = {
+        'query': request.query,
+        'answer': result.text,
+        'sources': result.pages,
+        'complete': result.complete,
+    }
+    if profile:
+        response['profile'] = result.profile
+    return response
+
+
+@app.post("/ticket")
+def ticket(request: TicketRequest):
+    """
+    Brouillon de ticket Freshdesk ; sans réponse fournie, la question est
+    d'abord traitée comme par /synthesize
+    """
+    answer, pages = request.answer, request.pages
+    if answer is None:
+        result = assistant.answer_query(request.query)
+        answer = result.text
+        pages = result.pages if pages is None else pages
+    return {
+        'query': request.query,
+        'ticket': assistant.create_freshdesk_ticket(request.query, answer, pages or []),
+    }
+
+
+@app.get("/healthz")
+def healthz():
+    return {'status': 'alive'}
+
+
+@app.get("/readyz")
+def readyz():
+    state = kaizen_warmup.readiness()
+    return JSONResponse(state, status_code=200 if state['ready'] else 503)
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(kaizen_metrics.render_prometheus(), media_type=kaizen_metrics.CONTENT_TYPE)
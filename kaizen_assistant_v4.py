@@ -5,12 +5,23 @@ Réponses professionnelles synthétisées
 """
 
 import streamlit as st
-import os
-from datetime import datetime
-import json
 import hashlib
-import subprocess
-import re
+
+import kaizen_answers
+import kaizen_index
+import kaizen_llm
+from kaizen_answers import Answer
+from kaizen_cache import get_query_cache
+from kaizen_passages import LINE_DEFINITION, LINE_HEADING, LINE_NAVIGATION, LINE_STEP, tagged_lines
+from kaizen_text import analyze, analyze_query
+from kaizen_metrics import increment, timed
+import kaizen_profiling
+import kaizen_metrics
+import kaizen_warmup
+
+# Sonde de disponibilité et préchauffage (sans effet s'ils sont déjà lancés
+# par kaizen_warmup.py)
+kaizen_warmup.start()
 
 st.set_page_config(
     page_title="Assistant Kaizen v4.0",
@@ -82,124 +93,121 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-class KaizenAssistant:
-    def __init__(self):
-        if os.path.exists("Kaizen_-_Manuel_ope_ratoire.pdf"):
-            self.pdf_path = "Kaizen_-_Manuel_ope_ratoire.pdf"
-        elif os.path.exists("/mnt/user-data/uploads/Kaizen_-_Manuel_ope_ratoire.pdf"):
-            self.pdf_path = "/mnt/user-data/uploads/Kaizen_-_Manuel_ope_ratoire.pdf"
-        else:
-            self.pdf_path = None
-        
-        self.history_file = "chat_history.json"
-        self.pdf_cache = None
-        self.load_history()
+class KaizenAssistant(kaizen_answers.KaizenAssistant):
+    """Recherche, cache et historique de kaizen_answers ; synthèse propre à la v4"""
     
-    def load_history(self):
-        try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    st.session_state.history = json.load(f)
-            else:
-                st.session_state.history = []
-        except:
-            st.session_state.history = []
+    CACHE_NAME = 'kaizen_assistant_v4'
     
-    def save_history(self):
-        try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(st.session_state.history, f, ensure_ascii=False, indent=2)
-        except:
-            pass
+    def __init__(self, user='default'):
+        super().__init__(user)
+        self.llm_busy = False
     
-    def extract_pdf_by_pages(self):
-        """Extrait le PDF page par page"""
-        if self.pdf_cache:
-            return self.pdf_cache
-        
-        if not self.pdf_path or not os.path.exists(self.pdf_path):
-            return None
-        
-        try:
-            result = subprocess.run(
-                ['pdftotext', '-layout', self.pdf_path, '-'],
-                capture_output=True, text=True, check=True
-            )
-            
-            pages = result.stdout.split('\f')
-            self.pdf_cache = {}
-            
-            for i, page_text in enumerate(pages, 1):
-                if page_text.strip():
-                    self.pdf_cache[i] = page_text.strip()
-            
-            return self.pdf_cache
-        except:
-            return None
+    def cache_variant(self, query, ranking):
+        # Pas de réponse type (concepts.json) dans la synthèse v4, mais le
+        # type de question dépend des accents et apostrophes, ignorés par la
+        # clé du cache ('Où est...' / 'ou est...')
+        return f"{ranking}:{self.question_type(query)}"
+    
+    def question_type(self, query):
+        """Type de question : 'how' (procédure), 'what' (définition), 'where' (emplacement) ou 'general'"""
+        query_lower = query.lower()
+        if any(w in query_lower for w in ['comment', 'créer', 'faire', 'générer']):
+            return 'how'
+        if any(w in query_lower for w in ['qu\'est-ce', 'c\'est quoi', 'définir']):
+            return 'what'
+        if any(w in query_lower for w in ['où', 'trouver', 'accéder']):
+            return 'where'
+        return 'general'
     
-    def search_pages(self, query):
-        """Recherche dans les pages du PDF"""
-        pages = self.extract_pdf_by_pages()
-        if not pages:
-            return []
-        
-        query_words = [w.lower() for w in query.split() if len(w) > 2]
-        results = []
-        
-        for page_num, page_text in pages.items():
-            page_lower = page_text.lower()
-            score = sum(page_lower.count(word) for word in query_words)
+    def stream_answer(self, query, ranking=kaizen_index.DEFAULT_RANKING):
+        """
+        Réponse rédigée par le modèle local (kaizen_llm), morceau par morceau
+        
+        Si le modèle est saturé (file d'attente pleine), le flux contient la
+        synthèse extractive et `self.llm_busy` est vrai une fois le flux lu
+        (l'assistant v4 est propre à la session Streamlit).
+        
+        Returns:
+            Answer: itérateur de morceaux de texte (None si aucun résultat),
+            pages, index complet
+        """
+        self.corpus.refresh()
+        content_hash = self.corpus.current.content_hash
+        complete = kaizen_index.index_ready(self.corpus.current)
+        self.llm_busy = False
+        
+        # Réponses rédigées en cache à part des synthèses extractives
+        variant = f"{ranking}:{kaizen_llm.MODEL_NAME}"
+        cache = get_query_cache(self.CACHE_NAME)
+        cached = cache.get(content_hash, query, variant)
+        increment('queries', cache='miss' if cached is None else 'hit')
+        if cached is not None:
+            answer, pages = cached
+            return Answer(iter([answer]), list(pages), complete)
+        
+        page_results = self.search_pages(query, ranking)
+        if not page_results:
+            return Answer(None, [], complete)
+        pages_found = list(dict.fromkeys(r['ref'] for r in page_results))
+        
+        def chunks():
+            generated = kaizen_llm.stream_answer(query, page_results)
+            try:
+                # Attend une place auprès du modèle avant d'afficher quoi que ce soit
+                first = next(generated, '')
+            except kaizen_llm.LLMBusy:
+                self.llm_busy = True
+                yield self.synthesize_answer(query, page_results)[0]
+                return
             
-            if score > 0:
-                results.append({
-                    'page': page_num,
-                    'score': score,
-                    'text': page_text
-                })
-        
-        results.sort(key=lambda x: x['score'], reverse=True)
-        return results[:5]
+            header = f"**D'après la documentation Kaizen ({', '.join(pages_found[:3])}) :**\n\n"
+            parts = [header, first]
+            yield header
+            yield first
+            for text in generated:
+                parts.append(text)
+                yield text
+            if complete:
+                cache.put(content_hash, query, (''.join(parts), pages_found), variant)
+        
+        return Answer(chunks(), pages_found, complete)
     
+    @timed('synthesize')
     def synthesize_answer(self, query, page_results):
         """VRAIE SYNTHÈSE intelligente - pas de copier-coller"""
         if not page_results:
             return None, []
         
-        pages_found = [r['page'] for r in page_results]
-        query_lower = query.lower()
+        # Plusieurs passages peuvent venir de la même page (références 'Manuel p.42')
+        pages_found = list(dict.fromkeys(r['ref'] for r in page_results))
         
-        # Analyser TOUT le contenu des pages pertinentes
-        all_text = "\n\join([r['text'] for r in page_results[:3]])
+        # Lignes des passages pertinents, classées à l'indexation (étape,
+        # définition, navigation, titre) : pas de découpage ni d'expression
+        # régulière à chaque question
+        lines = [line for r in page_results for line in tagged_lines(r['text'], r['line_kinds'])]
         
         # Détecter le type de question
-        is_how = any(w in query_lower for w in ['comment', 'créer', 'faire', 'générer'])
-        is_what = any(w in query_lower for w in ['qu\'est-ce', 'c\'est quoi', 'définir'])
-        is_where = any(w in query_lower for w in ['où', 'trouver', 'accéder'])
+        question_type = self.question_type(query)
         
         # Construire une VRAIE synthèse
-        answer = f"**D'après le manuel Kaizen (pages {', '.join(map(str, pages_found[:3]))}), voici la synthèse :**\n\n"
+        answer = f"**D'après la documentation Kaizen ({', '.join(pages_found[:3])}), voici la synthèse :**\n\n"
         
         # Extraire et reformuler les informations clés
-        if is_how:
-            answer += self._synthesize_how_to(all_text, query)
-        elif is_what:
-            answer += self._synthesize_definition(all_text, query)
-        elif is_where:
-            answer += self._synthesize_location(all_text, query)
+        if question_type == 'how':
+            answer += self._synthesize_how_to(lines, query)
+        elif question_type == 'what':
+            answer += self._synthesize_definition(lines, query)
+        elif question_type == 'where':
+            answer += self._synthesize_location(lines, query)
         else:
-            answer += self._synthesize_general(all_text, query)
+            answer += self._synthesize_general(lines, query)
         
         return answer, pages_found
     
-    def _synthesize_how_to(self, text, query):
+    def _synthesize_how_to(self, lines, query):
         """Synthétise une procédure"""
-        lines = [l.strip() for l in text.split('\n') if l.strip()]
-        
-        # Chercher les étapes numérotées
-        steps = []
-        for line in lines:
-            if re.match(r'^\d+[\.)]\s+|^Étape\s+\d+', line, re.IGNORECASE):
-                steps.append(line)
+        # Étapes numérotées (un titre numéroté n'est pas une étape)
+        steps = [line for line, kind in lines if kind & LINE_STEP and not kind & LINE_HEADING]
         
         if steps:
             synthesis = "### 📋 Procédure :\n\n"
@@ -209,10 +217,12 @@ class KaizenAssistant:
             # Pas d'étapes trouvées, faire une synthèse manuelle
             synthesis = "### 💡 Informations clés :\n\n"
             
-            # Extraire les phrases pertinentes
+            # Extraire les phrases pertinentes (termes normalisés, comme la
+            # clé du cache : 'Créer' et 'creer' donnent la même réponse)
+            query_terms = set(analyze_query(query))
             sentences = []
-            for line in lines:
-                if len(line) > 30 and any(w in line.lower() for w in query.lower().split()):
+            for line, _ in lines:
+                if len(line) > 30 and query_terms.intersection(analyze(line)):
                     sentences.append(line)
             
             for sent in sentences[:6]:
@@ -220,55 +230,43 @@ class KaizenAssistant:
         
         return synthesis + "\n\n💡 **Astuce :** Consultez les pages complètes pour plus de détails."
     
-    def _synthesize_definition(self, text, query):
+    def _synthesize_definition(self, lines, query):
         """Synthétise une définition"""
-        lines = [l.strip() for l in text.split('\n') if l.strip() and len(l) > 20]
-        
         synthesis = "### 📖 Définition :\n\n"
         
-        # Trouver les phrases définitoires
-        definitions = []
-        for line in lines[:15]:
-            line_lower = line.lower()
-            if any(marker in line_lower for marker in ['est', 'permet', 'désigne', 'correspond']):
-                definitions.append(line)
+        # Phrases définitoires parmi les 15 premières lignes significatives
+        candidates = [(line, kind) for line, kind in lines if len(line) > 20][:15]
+        definitions = [line for line, kind in candidates if kind & LINE_DEFINITION]
         
         for defin in definitions[:4]:
             synthesis += f"{defin}\n\n"
         
         return synthesis.strip()
     
-    def _synthesize_location(self, text, query):
+    def _synthesize_location(self, lines, query):
         """Synthétise un chemin de navigation"""
-        lines = [l.strip() for l in text.split('\n') if l.strip()]
-        
         synthesis = "### 📍 Accès dans Kaizen :\n\n"
         
-        # Chercher les mentions d'onglets, menus, boutons
-        nav_keywords = ['onglet', 'menu', 'bouton', 'cliquer', 'accéder', 'rendez-vous']
-        nav_lines = []
-        
-        for line in lines:
-            if any(kw in line.lower() for kw in nav_keywords):
-                nav_lines.append(line)
+        # Mentions d'onglets, menus, boutons
+        nav_lines = [line for line, kind in lines if kind & LINE_NAVIGATION]
         
         for nav in nav_lines[:5]:
             synthesis += f"• {nav}\n"
         
         return synthesis
     
-    def _synthesize_general(self, text, query):
+    def _synthesize_general(self, lines, query):
         """Synthèse générale"""
-        lines = [l.strip() for l in text.split('\n') if l.strip() and len(l) > 30]
-        
         synthesis = "### 💡 Informations trouvées :\n\n"
         
         # Extraire les lignes pertinentes
         relevant = []
-        query_words = query.lower().split()
+        query_terms = set(analyze_query(query))
         
-        for line in lines:
-            score = sum(1 for w in query_words if w in line.lower())
+        for line, _ in lines:
+            if len(line) <= 30:
+                continue
+            score = len(query_terms.intersection(analyze(line)))
             if score > 0:
                 relevant.append((score, line))
         
@@ -281,7 +279,8 @@ class KaizenAssistant:
 
 def main():
     if 'assistant' not in st.session_state:
-        st.session_state.assistant = KaizenAssistant()
+        # Historique séparé par utilisateur : ?user=<identifiant> dans l'URL
+        st.session_state.assistant = KaizenAssistant(st.query_params.get('user', 'default'))
     
     # En-tête
     st.markdown("# 🤖 Assistant Kaizen v4.0")
@@ -293,8 +292,21 @@ def main():
         st.markdown("**Version 4.0** - Synthèse IA")
         st.markdown("---")
         
-        if hasattr(st.session_state, 'history'):
-            st.metric("Questions posées", len(st.session_state.history))
+        st.metric("Questions posées", st.session_state.assistant.history.count())
+        corpus = st.session_state.assistant.corpus
+        st.metric("Documents", len(corpus.current.documents))
+        st.caption(" · ".join(doc.label for doc in corpus.current.documents))
+        if corpus.reindexing:
+            st.caption("🔄 Mise à jour de l'index en cours...")
+        cache_stats = get_query_cache(st.session_state.assistant.CACHE_NAME).stats()
+        st.caption(f"⚡ Cache : {cache_stats['entries']} réponses, {cache_stats['hit_rate']:.0%} des questions servies depuis le cache")
+        if kaizen_llm.available():
+            llm_state = kaizen_llm.get_model_pool().state()
+            st.caption(f"🧠 Rédaction : {kaizen_llm.MODEL_NAME} ({llm_state['running']} en cours, {llm_state['waiting']} en attente)")
+        if kaizen_metrics.SHOW_IN_SIDEBAR:
+            with st.expander("⏱️ Durées par étape"):
+                for stage, calls, mean_ms, p95_ms in kaizen_metrics.summary():
+                    st.caption(f"{stage} : {mean_ms:.1f} ms en moyenne, p95 {p95_ms:.1f} ms ({calls} appels)")
         
         st.markdown("---")
         st.info("""
@@ -308,7 +320,7 @@ def main():
         """)
         
         if st.button("🗑️ Effacer l'historique"):
-            st.session_state.history = []
+            st.session_state.assistant.history.clear()
             st.rerun()
     
     # Zone principale
@@ -340,34 +352,52 @@ def main():
             ticket_btn = st.button("🎫 Ticket Freshdesk", use_container_width=True)
         
         # Recherche
+        streamed = None
         if search_btn and query:
-            with st.spinner("🔎 Analyse et synthèse en cours..."):
-                page_results = st.session_state.assistant.search_pages(query)
-                
-                if page_results:
-                    answer, pages_found = st.session_state.assistant.synthesize_answer(query, page_results)
-                    
-                    # Sauvegarder
-                    st.session_state.history.append({
-                        'timestamp': datetime.now().isoformat(),
-                        'query': query,
-                        'answer': answer,
-                        'pages': pages_found
-                    })
-                    st.session_state.assistant.save_history()
-                    
-                    st.session_state.current_answer = answer
-                    st.session_state.current_pages = pages_found
-                else:
+            # ?profile=<KAIZEN_PROFILE_TOKEN> : profil de cette question
+            profile = kaizen_profiling.requested(st.query_params.get('profile'))
+            if kaizen_llm.available() and not profile:
+                # Réponse rédigée par le modèle local, affichée au fil de la génération
+                with st.spinner("🔎 Recherche en cours..."):
+                    result = st.session_state.assistant.stream_answer(query)
+                if result.text is None:
                     st.warning("Aucun résultat trouvé.")
+                else:
+                    streamed = result.text
+                    st.session_state.current_answer = None
+                    st.session_state.current_pages = result.pages
+            else:
+                with st.spinner("🔎 Analyse et synthèse en cours..."):
+                    result = st.session_state.assistant.answer_query(query, profile=profile)
+                    
+                    if result.text:
+                        # Sauvegarder
+                        st.session_state.assistant.add_to_history(query, result.text, result.pages)
+                        
+                        st.session_state.current_answer = result.text
+                        st.session_state.current_pages = result.pages
+                    else:
+                        st.warning("Aucun résultat trouvé.")
+            
+            if not result.complete:
+                st.info("⏳ Indexation des documents en cours : cette réponse ne porte que sur les pages déjà extraites.")
+            if result.profile:
+                st.caption(f"🔬 Profil enregistré : {result.profile}")
         
         # Affichage réponse
-        if 'current_answer' in st.session_state and st.session_state.current_answer:
+        if streamed is not None or st.session_state.get('current_answer'):
             st.markdown("---")
             
             st.markdown('<div class="answer-container">', unsafe_allow_html=True)
             st.markdown('<div class="answer-title">✅ Synthèse</div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="answer-content">{st.session_state.current_answer}</div>', unsafe_allow_html=True)
+            if streamed is not None:
+                answer = st.write_stream(streamed)
+                st.session_state.current_answer = answer
+                st.session_state.assistant.add_to_history(query, answer, st.session_state.current_pages)
+                if st.session_state.assistant.llm_busy:
+                    st.info("⏳ Modèle de rédaction occupé : synthèse extraite de la documentation.")
+            else:
+                st.markdown(f'<div class="answer-content">{st.session_state.current_answer}</div>', unsafe_allow_html=True)
             st.markdown('</div>', unsafe_allow_html=True)
             
             # Références
@@ -375,7 +405,7 @@ def main():
                 st.markdown('<div class="reference-container">', unsafe_allow_html=True)
                 st.markdown("**📍 Pages consultées :**")
                 for page in st.session_state.current_pages:
-                    st.markdown(f'<span class="page-badge">📄 Page {page}</span>', unsafe_allow_html=True)
+                    st.markdown(f'<span class="page-badge">📄 {page}</span>', unsafe_allow_html=True)
                 st.markdown('</div>', unsafe_allow_html=True)
             
             # Feedback
@@ -392,10 +422,11 @@ def main():
     with col2:
         st.markdown("### 📜 Historique")
         
-        if hasattr(st.session_state, 'history') and st.session_state.history:
-            for entry in reversed(st.session_state.history[-5:]):
+        recent = st.session_state.assistant.history.tail(5)
+        if recent:
+            for entry in reversed(recent):
                 with st.expander(f"🔍 {entry['query'][:40]}..."):
-                    st.write(f"**Pages :** {', '.join(map(str, entry.get('pages', []))[:3])}")
+                    st.write(f"**Pages :** {', '.join(map(str, entry.get('pages', [])[:3]))}")
         else:
             st.info("Aucun historique")
         
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Traitement par lot de questions
+Rejoue des questions (historique, FAQ...) à travers la recherche et la
+synthèse de l'assistant, par exemple pour régénérer les réponses après une
+mise à jour du manuel. Les questions sont lues au fil du fichier, traitées
+en parallèle sur plusieurs cœurs et les résultats écrits en JSON Lines,
+dans l'ordre d'entrée, avec la durée de chaque question.
+
+Formats d'entrée :
+    chat_history.json    ancien historique (liste JSON d'entrées 'query')
+    *.jsonl              journal d'historique (une entrée JSON par ligne)
+    autre                une question par ligne
+
+Usage :
+    python kaizen_batch.py chat_history.json -o reponses.jsonl
+    python kaizen_batch.py questions.txt --workers 8 --ranking hybrid
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import kaizen_index
+from kaizen_answers import KaizenAssistant
+from kaizen_text import query_key
+
+
+def read_questions(path):
+    """
+    Questions d'un fichier, lues au fil de l'eau (sauf l'ancien format
+    JSON, qui est une seule liste)
+
+    Yields:
+        str: Question non vide
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            for entry in json.load(f):
+                query = entry.get('query', '') if isinstance(entry, dict) else str(entry)
+                if query.strip():
+                    yield query.strip()
+            return
+
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                try:
+                    line = json.loads(line).get('query', '').strip()
+                except ValueError:
+                    pass
+            if line:
+                yield line
+
+
+def unique(questions):
+    """Retire les questions déjà vues (à la casse, aux accents et à la ponctuation près)"""
+    seen = set()
+    for query in questions:
+        key = query_key(query)
+        if key not in seen:
+            seen.add(key)
+            yield query
+
+
+# Assistant du processus de travail (créé par _init_worker)
+_assistant = None
+_ranking = kaizen_index.DEFAULT_RANKING
+
+
+def _init_worker(ranking):
+    """Prépare un processus de travail : l'index complet doit être chargé"""
+    global _assistant, _ranking
+    _assistant = KaizenAssistant(user='batch')
+    _ranking = ranking
+    kaizen_index.get_index(_assistant.corpus.current)
+    if ranking in ('semantic', 'hybrid'):
+        from kaizen_vectors import get_vector_index
+        get_vector_index(_assistant.corpus.current)
+
+
+def _answer(item):
+    """Recherche et synthèse d'une question, avec sa durée"""
+    number, query = item
+    start = time.perf_counter()
+    try:
+        results = _assistant.search_pages(query, _ranking)
+        answer, pages = _assistant.synthesize_answer(query, results)
+        error = None
+    except Exception as e:  # une question en erreur ne doit pas arrêter le lot
+        answer, pages, error = None, [], f"{type(e).__name__}: {e}"
+
+    result = {
+        'n': number,
+        'query': query,
+        'answer': answer,
+        'sources': pages,
+        'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+    }
+    if error:
+        result['error'] = error
+    return result
+
+
+def run(questions, output, workers=None, ranking=kaizen_index.DEFAULT_RANKING, chunksize=8):
+    """
+    Traite des questions et écrit une ligne JSON par question
+
+    L'index est chargé une fois dans ce processus avant de créer les
+    processus de travail : avec fork (Linux), ils le partagent sans le
+    recharger ; sinon chacun le relit depuis le cache disque.
+
+    Returns:
+        dict: Statistiques du lot (questions, erreurs, durées)
+    """
+    _init_worker(ranking)
+    if _assistant.corpus.current.content_hash is None:
+        raise RuntimeError("Aucun document du corpus n'est disponible")
+
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    count = errors = 0
+    latencies = []
+
+    items = enumerate(questions, 1)
+    if workers == 1:
+        results = map(_answer, items)
+        pool = None
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        pool = context.Pool(workers, initializer=_init_worker, initargs=(ranking,))
+        results = pool.imap(_answer, items, chunksize)
+
+    try:
+        for result in results:
+            output.write(json.dumps(result, ensure_ascii=False) + '\n')
+            count += 1
+            errors += 'error' in result
+            latencies.append(result['latency_ms'])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    latencies.sort()
+    return {
+        'questions': count,
+        'errors': errors,
+        'total_s': round(time.perf_counter() - start, 2),
+        'mean_ms': round(sum(latencies) / count, 2) if count else 0,
+        'max_ms': latencies[-1] if latencies else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Traitement par lot de questions Kaizen (sortie JSON Lines)")
+    parser.add_argument('input', help="Fichier de questions (.json, .jsonl ou une question par ligne)")
+    parser.add_argument('-o', '--output', default='-', help="Fichier de sortie JSON Lines (par défaut : sortie standard)")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Processus de travail (par défaut : nombre de cœurs)")
+    parser.add_argument('--ranking', default=kaizen_index.DEFAULT_RANKING, choices=kaizen_index.RANKING_MODES)
+    parser.add_argument('--unique', action='store_true', help="Ne traiter qu'une fois chaque question")
+    args = parser.parse_args(argv)
+
+    questions = read_questions(args.input)
+    if args.unique:
+        questions = unique(questions)
+
+    if args.output == '-':
+        stats = run(questions, sys.stdout, args.workers, args.ranking)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            stats = run(questions, output, args.workers, args.ranking)
+
+    print(
+        f"✅ {stats['questions']} questions en {stats['total_s']} s "
+        f"(moyenne {stats['mean_ms']} ms, max {stats['max_ms']} ms, {stats['errors']} erreurs)",
+        file=sys.stderr
+    )
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai de la recherche et de la détection de concepts
+Mesure l'effet d'une modification de search_pages() / detect_concept() sur
+un corpus synthétique de plusieurs centaines de pages (aucun PDF requis) et
+un jeu de questions étiquetées :
+
+    - latence p50 / p95 / p99 et débit, par mode de classement (et par étape
+      lexicale, vectorielle et de fusion en mode hybride)
+    - mémoire : pic pendant la construction de l'index et pendant les recherches
+    - qualité : rappel@k et MRR (pages pertinentes connues pour chaque question)
+    - détection de concepts : latence et exactitude
+
+Le corpus et les questions ne dépendent que de la graine : deux exécutions
+sont comparables. Le résultat est un JSON stable (clés triées, valeurs
+arrondies), à conserver et à comparer entre deux versions du code.
+
+Usage :
+    python kaizen_bench.py -o bench.json
+    python kaizen_bench.py --pages 600 --repeat 5 --modes bm25f hybrid
+    python kaizen_bench.py -o apres.json --compare bench.json
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import kaizen_index
+import kaizen_store
+import kaizen_text
+from kaizen_concepts import get_concept_registry
+from kaizen_corpus import CorpusVersion, Document
+from kaizen_store import PageStore, cache_path, write_pages_file
+
+# Sujets du corpus synthétique : (identifiant, objet, complément, termes associés)
+TOPICS = [
+    ('devis', 'le devis', 'du devis', ['devis', 'prestation', 'tarif horaire', 'mensualisation']),
+    ('facture', 'la facture', 'de la facture', ['facture', 'échéance', 'montant TTC', 'avoir']),
+    ('contrat', 'le contrat', 'du contrat', ['contrat', 'CDI', "période d'essai", 'avenant']),
+    ('planning', 'le planning', 'du planning', ['planning', 'créneau', 'horaires', 'calendrier']),
+    ('paiement', 'le paiement', 'du paiement', ['paiement', 'prélèvement SEPA', 'règlement', 'relance']),
+    ('famille', 'la fiche famille', 'de la fiche famille', ['famille', 'bénéficiaire', 'adresse', 'contact']),
+    ('salarie', 'le salarié', 'du salarié', ['salarié', 'intervenant', 'compétences', 'disponibilités']),
+    ('urssaf', 'la déclaration URSSAF', 'de la déclaration URSSAF', ['URSSAF', 'cotisations', 'DSN', 'période']),
+    ('appariement', "l'appariement", "de l'appariement", ['appariement', 'affectation', 'critères', 'mission']),
+    ('signature', 'la signature électronique', 'de la signature électronique', ['Yousign', 'signataire', 'document', 'signature']),
+    ('aici', "l'avance immédiate", "de l'avance immédiate", ['avance immédiate', "crédit d'impôt", 'AICI', 'mandat']),
+    ('tableau', 'le tableau de bord', 'du tableau de bord', ['tableau de bord', 'indicateur', 'widget', 'statistiques']),
+]
+
+# Actions : (verbe, nom de l'action, impératif)
+ACTIONS = [
+    ('créer', 'la création', 'Créez'),
+    ('modifier', 'la modification', 'Modifiez'),
+    ('supprimer', 'la suppression', 'Supprimez'),
+    ('valider', 'la validation', 'Validez'),
+    ('exporter', "l'export", 'Exportez'),
+    ('consulter', 'la consultation', 'Consultez'),
+    ('annuler', "l'annulation", 'Annulez'),
+    ('imprimer', "l'impression", 'Imprimez'),
+]
+
+MENUS = ['Gestion', 'Administration', 'Paramètres', 'Clients', 'Ressources humaines', 'Comptabilité']
+BUTTONS = ['Enregistrer', 'Valider', 'Suivant', 'Appliquer', 'Confirmer']
+FIELDS = ['référence', 'date de début', 'commentaire', 'statut', 'responsable', 'code interne']
+
+SENTENCES = [
+    "Ouvrez le menu {menu} puis cliquez sur {button} pour confirmer {action_noun} {de_obj}.",
+    "Le champ {field} {de_obj} doit être renseigné avant {action_noun}.",
+    "Depuis l'onglet {menu}, sélectionnez {obj} puis utilisez le bouton {button}.",
+    "{Action_noun} {de_obj} met à jour le suivi : {term} et {term2} sont recalculés automatiquement.",
+    "Un message de confirmation s'affiche à la fin de {action_noun} ; le champ {field} est conservé dans l'historique.",
+    "Les droits du profil {menu} sont nécessaires pour {verb} {obj}.",
+]
+NOISE = "Voir aussi {action_noun} {de_obj} dans le menu {menu}, au chapitre {chapter}."
+
+QUERY_TEMPLATES = [
+    "Comment {verb} {obj} ?",
+    "{verb} {obj}",
+    "Où se trouve {action_noun} {de_obj} ?",
+    "procédure pour {verb} {term}",
+]
+
+# Questions étiquetées avec le concept attendu (None : aucun concept)
+CONCEPT_QUERIES = [
+    ("Quelle différence entre un devis au réel et un devis mensualisé ?", 'devis_types'),
+    ("C'est quoi la mensualisation ?", 'devis_types'),
+    ("Comment créer un devis ?", 'devis_creation'),
+    ("Je voudrais faire un devis pour une nouvelle famille", 'devis_creation'),
+    ("Comment fonctionne l'avance immédiate ?", 'aici'),
+    ("Le crédit d'impôt de 50% est-il automatique ?", 'aici'),
+    ("Comment générer une facture ?", 'facture'),
+    ("La facturation du mois est fausse", 'facture'),
+    ("Quel contrat pour une embauche en CDI ?", 'contrat'),
+    ("Comment envoyer un document en signature électronique ?", 'yousign'),
+    ("Le client n'arrive pas à signer sur Yousign", 'yousign'),
+    ("Que montre le tableau de bord ?", 'dashboard'),
+    ("Comment affecter un intervenant à une famille ?", 'appariement'),
+    ("Comment créer une fiche famille ?", 'famille'),
+    ("Où ajouter une famille ?", 'famille'),
+    ("Comment recruter un nouveau salarié ?", 'salarie'),
+    ("Modifier le planning de la semaine", 'planning'),
+    ("Comment changer les horaires d'une intervention ?", 'planning'),
+    ("Le prélèvement SEPA a échoué", 'paiement'),
+    ("Comment enregistrer un règlement ?", 'paiement'),
+    ("Comment faire la déclaration URSSAF ?", 'urssaf'),
+    ("Où voir les cotisations ?", 'urssaf'),
+    ("Comment changer mon mot de passe ?", None),
+    ("Bonjour", None),
+]
+
+
+def _fill(template, rng, topic, action, **extra):
+    """Remplit un modèle de phrase pour un sujet et une action"""
+    _, obj, de_obj, terms = topic
+    verb, action_noun, _ = action
+    term, term2 = rng.sample(terms, 2)
+    values = {
+        'obj': obj, 'de_obj': de_obj, 'verb': verb, 'action_noun': action_noun,
+        'Action_noun': action_noun[0].upper() + action_noun[1:],
+        'term': term, 'term2': term2,
+        'menu': rng.choice(MENUS), 'button': rng.choice(BUTTONS), 'field': rng.choice(FIELDS),
+    }
+    values.update(extra)
+    return template.format(**values)
+
+
+def _page_text(rng, chapter, topic, action):
+    """Texte d'une page : titre, présentation, étapes et renvoi vers un autre sujet"""
+    _, obj, de_obj, _ = topic
+    lines = [f"{chapter}. {action[1].upper()} {de_obj.upper()}", ""]
+
+    for _ in range(2):
+        lines.append(' '.join(_fill(t, rng, topic, action) for t in rng.sample(SENTENCES, 3)))
+        lines.append("")
+
+    for step in range(1, rng.randint(3, 5) + 1):
+        lines.append(f"Étape {step} : {action[2]} {obj} depuis l'écran {rng.choice(MENUS)}, "
+                     f"vérifiez le champ {rng.choice(FIELDS)} puis cliquez sur {rng.choice(BUTTONS)}.")
+    lines.append("")
+
+    # Bruit : chaque page cite aussi un autre sujet
+    other_topic, other_action = rng.choice(TOPICS), rng.choice(ACTIONS)
+    lines.append(_fill(NOISE, rng, other_topic, other_action, chapter=rng.randint(1, 300)))
+    return '\n'.join(lines)
+
+
+def generate_corpus(pages=300, documents=2, seed=42):
+    """
+    Corpus synthétique et questions étiquetées
+
+    Chaque page traite d'un couple (sujet, action) ; une question porte sur
+    un couple et ses pages pertinentes sont toutes celles de ce couple.
+
+    Args:
+        pages: Nombre total de pages (réparties entre les documents)
+        documents: Nombre de documents
+        seed: Graine du générateur
+
+    Returns:
+        tuple: ({identifiant de document: {page: texte}},
+        [{'query', 'relevant': [[document, page]]}])
+    """
+    rng = random.Random(seed)
+    pairs = [(topic, action) for topic in TOPICS for action in ACTIONS]
+    rng.shuffle(pairs)
+
+    doc_ids = ['manuel'] + [f"document_{n}" for n in range(2, documents + 1)]
+    corpus = {doc_id: {} for doc_id in doc_ids}
+    relevant = {}
+    for n in range(pages):
+        # Le premier document (le manuel) reçoit les deux tiers des pages
+        doc_id = doc_ids[0] if documents == 1 or rng.random() < 2 / 3 else rng.choice(doc_ids[1:])
+        page = len(corpus[doc_id]) + 1
+        topic, action = pairs[n % len(pairs)]
+        corpus[doc_id][page] = _page_text(rng, n + 1, topic, action)
+        relevant.setdefault((topic[0], action[0]), []).append([doc_id, page])
+
+    queries = []
+    seen = set()
+    for topic, action in pairs:
+        key = (topic[0], action[0])
+        if key not in relevant:
+            continue
+        query = _fill(rng.choice(QUERY_TEMPLATES), rng, topic, action)
+        if rng.random() < 0.25:
+            query = kaizen_text.fold(query)  # saisie sans accents ni majuscules
+        if query not in seen:
+            seen.add(query)
+            queries.append({'query': query, 'relevant': relevant[key]})
+
+    return corpus, queries
+
+
+def build_corpus(pages_by_doc, directory, seed):
+    """
+    Version de corpus adossée au corpus synthétique
+
+    Un fichier factice tient lieu de PDF (son empreinte identifie le
+    document) et ses pages sont déposées directement dans le cache disque
+    au format fichier de pages : l'extraction n'a pas lieu, la suite du
+    chemin (mmap, index, vecteurs) est celle de l'application.
+    """
+    documents = []
+    for doc_id, pages in pages_by_doc.items():
+        path = os.path.join(directory, f"{doc_id}.pdf")
+        digest = hashlib.sha256(json.dumps(pages, sort_keys=True).encode('utf-8')).hexdigest()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"%PDF synthétique {doc_id} graine={seed} {digest}\n")
+
+        store = PageStore(path)
+        write_pages_file(cache_path('pages', store.identify(), '.pages'), pages)
+        label = 'Manuel' if doc_id == 'manuel' else doc_id.replace('_', ' ').capitalize()
+        documents.append(Document(doc_id, label, path, store))
+
+    return CorpusVersion(documents)
+
+
+def percentile(sorted_values, p):
+    """Percentile par rang le plus proche d'une liste triée"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _latency_stats(latencies, total_s):
+    latencies = sorted(latencies)
+    return {
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        'qps': round(len(latencies) / total_s, 1) if total_s else 0.0,
+    }
+
+
+def _measure_memory(function, *args):
+    """Pic de mémoire allouée (Ko) par un appel et mémoire encore retenue après"""
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = function(*args)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, round((peak - baseline) / 1024, 1), round((current - baseline) / 1024, 1)
+
+
+def _clear_query_caches(corpus, mode):
+    """Vide les caches de questions : chaque tour mesure des questions non encore vues"""
+    kaizen_text.analyze_query.cache_clear()
+    if mode in ('semantic', 'hybrid'):
+        from kaizen_vectors import get_vector_index
+        get_vector_index(corpus)._encode_query.cache_clear()
+
+
+def _ranked_pages(results):
+    """Pages distinctes des résultats, dans l'ordre du classement"""
+    return list(dict.fromkeys((r['doc'], r['page']) for r in results))
+
+
+def bench_mode(corpus, queries, mode, limit=5, repeat=1):
+    """
+    Latence, débit, mémoire et qualité d'un mode de classement
+
+    La première recherche (qui construit l'index vectoriel si besoin) est
+    mesurée à part ; chaque tour rejoue toutes les questions après avoir
+    vidé les caches de questions.
+    """
+    start = time.perf_counter()
+    kaizen_index.search_passages(corpus, "banc d'essai préchauffage", limit, mode)
+    first_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    stage_latencies = {}  # étapes de la recherche hybride : lexical, vector, fusion
+    rankings = []
+    total = 0.0
+    for round_number in range(repeat):
+        _clear_query_caches(corpus, mode)
+        for item in queries:
+            timings = {}
+            start = time.perf_counter()
+            results = kaizen_index.search_passages(corpus, item['query'], limit, mode, timings)
+            elapsed = time.perf_counter() - start
+            total += elapsed
+            latencies.append(elapsed * 1000)
+            for stage, ms in timings.items():
+                if stage != 'search_ms':
+                    stage_latencies.setdefault(stage[:-3], []).append(ms)
+            if round_number == 0:
+                rankings.append(_ranked_pages(results))
+
+    recall = reciprocal = 0.0
+    for item, ranked in zip(queries, rankings):
+        relevant = {tuple(ref) for ref in item['relevant']}
+        found = [rank for rank, ref in enumerate(ranked, 1) if ref in relevant]
+        recall += len(found) / len(relevant)
+        reciprocal += 1 / found[0] if found else 0.0
+
+    _clear_query_caches(corpus, mode)
+    _, peak_kb, _ = _measure_memory(
+        lambda: [kaizen_index.search_passages(corpus, item['query'], limit, mode) for item in queries]
+    )
+
+    stats = _latency_stats(latencies, total)
+    stats.update({
+        'first_query_ms': round(first_ms, 3),
+        f"recall@{limit}": round(recall / len(queries), 4) if queries else 0.0,
+        'mrr': round(reciprocal / len(queries), 4) if queries else 0.0,
+        'search_peak_kb': peak_kb,
+    })
+    if stage_latencies:
+        stats['stages'] = {}
+        for stage, values in stage_latencies.items():
+            values.sort()
+            stats['stages'][stage] = {
+                'p50_ms': round(percentile(values, 50), 3),
+                'p95_ms': round(percentile(values, 95), 3),
+            }
+    return stats
+
+
+def bench_concepts(repeat=1):
+    """Latence et exactitude de la détection du concept principal"""
+    registry = get_concept_registry()
+    registry.matcher  # automate compilé hors mesure
+
+    def detect_concept(query):
+        # Même règle que KaizenAssistant.detect_concept
+        matches = registry.match(query)
+        return matches[0][0] if matches else None
+
+    latencies = []
+    total = 0.0
+    correct = 0
+    for round_number in range(repeat):
+        for query, expected in CONCEPT_QUERIES:
+            start = time.perf_counter()
+            concept = detect_concept(query)
+            elapsed = time.perf_counter() - start
+            total += elapsed
+            latencies.append(elapsed * 1000)
+            if round_number == 0:
+                correct += concept == expected
+
+    stats = _latency_stats(latencies, total)
+    stats['accuracy'] = round(correct / len(CONCEPT_QUERIES), 4)
+    return stats
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run(pages=300, documents=2, seed=42, modes=kaizen_index.RANKING_MODES, limit=5, repeat=1):
+    """
+    Exécute le banc d'essai dans un cache disque temporaire (index construits
+    à froid)
+
+    Returns:
+        dict: Résultats (voir l'en-tête du module)
+    """
+    pages_by_doc, queries = generate_corpus(pages, documents, seed)
+    cache_dir = kaizen_store.CACHE_DIR
+
+    with tempfile.TemporaryDirectory(prefix='kaizen-bench-') as directory:
+        kaizen_store.CACHE_DIR = os.path.join(directory, 'cache')
+        try:
+            corpus = build_corpus(pages_by_doc, directory, seed)
+
+            start = time.perf_counter()
+            index = kaizen_index.get_index(corpus)
+            build_ms = (time.perf_counter() - start) * 1000
+
+            # Mémoire de l'index : reconstruction en mémoire, hors cache disque
+            # (tracemalloc fausserait la durée de la construction mesurée ci-dessus)
+            _, index_peak_kb, index_kb = _measure_memory(
+                lambda: kaizen_index.InvertedIndex.merge(
+                    [(doc.id, kaizen_index.InvertedIndex(doc.store.get_pages())) for doc in corpus.documents]
+                )
+            )
+
+            results = {}
+            for mode in modes:
+                if mode in ('semantic', 'hybrid'):
+                    try:
+                        import numpy  # noqa: F401
+                    except ImportError:
+                        results[mode] = {'skipped': 'numpy non installé'}
+                        continue
+                results[mode] = bench_mode(corpus, queries, mode, limit, repeat)
+        finally:
+            kaizen_store.CACHE_DIR = cache_dir
+
+    return {
+        'config': {
+            'pages': pages,
+            'documents': documents,
+            'seed': seed,
+            'queries': len(queries),
+            'concept_queries': len(CONCEPT_QUERIES),
+            'limit': limit,
+            'repeat': repeat,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'index': {
+            'passages': len(index.passages),
+            'terms': len(index.postings),
+            'build_ms': round(build_ms, 1),
+            'build_peak_kb': index_peak_kb,
+            'retained_kb': index_kb,
+        },
+        'modes': results,
+        'concepts': bench_concepts(repeat),
+        'max_rss_mb': _max_rss_mb(),
+    }
+
+
+def _flatten(data, prefix=''):
+    """{'modes': {'bm25': {'p50_ms': 1}}} → {'modes.bm25.p50_ms': 1} (valeurs numériques)"""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+# Métriques dont une hausse est une amélioration (les autres : durées, mémoire)
+HIGHER_IS_BETTER = ('qps', 'recall@', 'mrr', 'accuracy')
+
+
+def compare(previous, current, threshold=10.0):
+    """
+    Écarts entre deux résultats
+
+    Returns:
+        list: Lignes 'métrique : avant → après (écart %)', marquées ⚠️ au-delà
+        de `threshold` % dans le mauvais sens
+    """
+    before, after = _flatten(previous), _flatten(current)
+    lines = []
+    for name in sorted(set(before) | set(after)):
+        if name.startswith(('config.', 'environment.')):
+            continue
+        old, new = before.get(name), after.get(name)
+        if old is None or new is None:
+            lines.append(f"  {name} : {old} → {new}")
+            continue
+        if old == new:
+            continue
+        change = (new - old) / old * 100 if old else float('inf')
+        better = any(marker in name.rsplit('.', 1)[-1] for marker in HIGHER_IS_BETTER)
+        worse = -change if better else change
+        flag = '⚠️ ' if worse > threshold else '  '
+        lines.append(f"{flag}{name} : {old} → {new} ({change:+.1f} %)")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai de la recherche Kaizen (corpus synthétique)")
+    parser.add_argument('-o', '--output', help="Fichier JSON des résultats (par défaut : sortie standard)")
+    parser.add_argument('--pages', type=int, default=300, help="Nombre de pages du corpus synthétique")
+    parser.add_argument('--documents', type=int, default=2, help="Nombre de documents du corpus")
+    parser.add_argument('--seed', type=int, default=42, help="Graine du corpus et des questions")
+    parser.add_argument('--modes', nargs='+', default=list(kaizen_index.RANKING_MODES), choices=kaizen_index.RANKING_MODES)
+    parser.add_argument('--limit', type=int, default=5, help="Résultats par recherche (rappel@k)")
+    parser.add_argument('--repeat', type=int, default=3, help="Tours de questions pour les latences")
+    parser.add_argument('--compare', metavar='JSON', help="Résultats précédents à comparer")
+    args = parser.parse_args(argv)
+
+    results = run(args.pages, max(1, args.documents), args.seed, args.modes, args.limit, max(1, args.repeat))
+    text = json.dumps(results, ensure_ascii=False, indent=2, sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+    recall = f"recall@{args.limit}"
+    for mode, stats in results['modes'].items():
+        if 'skipped' in stats:
+            print(f"{mode:>9} : ignoré ({stats['skipped']})", file=sys.stderr)
+            continue
+        print(
+            f"{mode:>9} : p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, p99 {stats['p99_ms']} ms, "
+            f"{stats['qps']} q/s, {recall} {stats[recall]}, MRR {stats['mrr']}",
+            file=sys.stderr
+        )
+    concepts = results['concepts']
+    print(f" concepts : p50 {concepts['p50_ms']} ms, exactitude {concepts['accuracy']}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        print(f"\nÉcarts par rapport à {args.compare} :", file=sys.stderr)
+        print('\n'.join(compare(previous, results)) or "  aucun", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
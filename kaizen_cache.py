@@ -0,0 +1,148 @@
+"""
+Cache des réponses aux questions
+Partagé par toutes les sessions du processus : une question déjà posée
+(à la casse, aux accents et à la ponctuation près) ne relance ni la
+recherche ni la synthèse. Le cache est borné en nombre d'entrées et en
+mémoire, les entrées expirent après un délai et tout est invalidé quand
+le contenu du manuel change.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from kaizen_text import query_key
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get('KAIZEN_QUERY_CACHE_ENTRIES', 1000))
+DEFAULT_MAX_BYTES = int(float(os.environ.get('KAIZEN_QUERY_CACHE_MB', 16)) * 1024 * 1024)
+DEFAULT_TTL = float(os.environ.get('KAIZEN_QUERY_CACHE_TTL', 3600))
+
+
+def _estimate_size(key, value):
+    """Taille approximative d'une entrée en mémoire (octets)"""
+    size = sys.getsizeof(key)
+    for item in value:
+        size += sys.getsizeof(item)
+        if isinstance(item, (list, tuple)):
+            size += sum(sys.getsizeof(x) for x in item)
+    return size
+
+
+class QueryCache:
+    """
+    Cache LRU avec durée de vie : clé de question normalisée → (réponse, pages)
+
+    Les compteurs hits / misses / evictions / expirations sont exposés par
+    stats().
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.content_hash = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _check_content(self, content_hash):
+        """Vide le cache si le manuel a changé (appelé sous le verrou)"""
+        if content_hash != self.content_hash:
+            self._entries.clear()
+            self._bytes = 0
+            self.content_hash = content_hash
+
+    def get(self, content_hash, query, variant=''):
+        """
+        Réponse en cache pour une question
+
+        Args:
+            content_hash: Empreinte du manuel utilisé pour répondre
+            query: Question de l'utilisateur
+            variant: Paramètres qui changent la réponse (mode de classement...)
+
+        Returns:
+            tuple (réponse, pages) ou None
+        """
+        key = (variant, query_key(query))
+
+        with self._lock:
+            self._check_content(content_hash)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, content_hash, query, value, variant=''):
+        """Enregistre la réponse (réponse, pages) d'une question"""
+        key = (variant, query_key(query))
+        value = (value[0], tuple(value[1]))
+        size = _estimate_size(key, value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._check_content(content_hash)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Compteurs et occupation du cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+# Caches du processus, un par application (les réponses diffèrent entre versions)
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_query_cache(name):
+    """Retourne le cache partagé d'une application"""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = QueryCache()
+            _caches[name] = cache
+    return cache
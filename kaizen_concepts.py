@@ -0,0 +1,215 @@
+"""
+Registre des concepts Kaizen
+Les mots-clés de concepts.json sont compilés une seule fois en automate
+d'Aho-Corasick sur les termes normalisés : une seule passe sur la question
+trouve tous les concepts présents, quelle que soit la taille du dictionnaire.
+Les réponses types sont lues dans le même fichier et retrouvées par simple
+accès au dictionnaire ; le fichier est rechargé à chaud s'il est modifié.
+
+Format de concepts.json :
+    {
+      "aici": {
+        "keywords": ["aici", "avance immédiate", {"text": "ais", "weight": 0.5}],
+        "answer": ["**💰 AICI - Avance Immédiate Crédit d'Impôt**", "", "..."]
+      },
+      ...
+    }
+Un mot-clé vaut par défaut son nombre de termes : une expression précise
+("créer un devis") l'emporte sur un mot isolé ("devis"). La réponse est une
+chaîne ou une liste de lignes.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from kaizen_text import analyze, analyze_query
+
+CONCEPTS_FILE = os.environ.get(
+    'KAIZEN_CONCEPTS_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'concepts.json')
+)
+
+# Intervalle minimal entre deux vérifications de la date du fichier (secondes)
+RELOAD_INTERVAL = 2.0
+
+
+def load_concepts(path=CONCEPTS_FILE):
+    """
+    Charge le dictionnaire des concepts
+
+    Returns:
+        dict: {concept: définition} dans l'ordre du fichier ({} si illisible)
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class ConceptMatcher:
+    """
+    Automate d'Aho-Corasick dont l'alphabet est l'ensemble des termes normalisés
+
+    Travailler sur des termes plutôt que sur des caractères rend la
+    recherche sensible aux frontières de mots ('ais' ne correspond pas à
+    'mais') et insensible aux accents, élisions et pluriels.
+    """
+
+    def __init__(self, concepts):
+        self.concepts = list(concepts)
+        self._order = {concept: i for i, concept in enumerate(self.concepts)}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for concept, definition in concepts.items():
+            seen = set()
+            for keyword in definition.get('keywords', []):
+                if isinstance(keyword, dict):
+                    text, weight = keyword['text'], keyword.get('weight')
+                else:
+                    text, weight = keyword, None
+
+                terms = tuple(analyze(text))
+                if not terms or terms in seen:
+                    continue
+                seen.add(terms)
+                self._add(terms, concept, float(weight if weight is not None else len(terms)))
+
+        self._build_failure_links()
+
+    def _add(self, terms, concept, weight):
+        state = 0
+        for term in terms:
+            next_state = self._goto[state].get(term)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][term] = next_state
+            state = next_state
+        self._output[state].append((concept, weight))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for term, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and term not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(term, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def match(self, query):
+        """
+        Concepts présents dans une question
+
+        Returns:
+            list: [(concept, poids)] par poids décroissant, à poids égal
+            dans l'ordre de concepts.json
+        """
+        weights = {}
+        state = 0
+        for term in analyze_query(query):
+            while state and term not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(term, 0)
+            for concept, weight in self._output[state]:
+                weights[concept] = weights.get(concept, 0) + weight
+
+        return sorted(weights.items(), key=lambda item: (-item[1], self._order[item[0]]))
+
+
+class ConceptRegistry:
+    """
+    Concepts, automate de détection et réponses types, partagés par le processus
+
+    La date de modification du fichier est vérifiée au plus toutes les
+    RELOAD_INTERVAL secondes ; en cas de changement, l'automate et les
+    réponses sont reconstruits puis remplacés d'un bloc, sans redémarrer
+    Streamlit.
+    """
+
+    def __init__(self, path=CONCEPTS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._state = (ConceptMatcher({}), {})
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """Recharge le fichier s'il a changé depuis le dernier chargement"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime and not force:
+            return
+
+        with self._lock:
+            if mtime == self._mtime and not force:
+                return
+            concepts = load_concepts(self.path)
+            answers = {}
+            for concept, definition in concepts.items():
+                answer = definition.get('answer')
+                if isinstance(answer, list):
+                    answer = '\n'.join(answer)
+                if answer:
+                    answers[concept] = answer
+            self._state = (ConceptMatcher(concepts), answers)
+            self._mtime = mtime
+
+    @property
+    def matcher(self):
+        self.refresh()
+        return self._state[0]
+
+    @property
+    def version(self):
+        """Identifie le contenu chargé (change à chaque rechargement du fichier)"""
+        self.refresh()
+        return self._mtime
+
+    @property
+    def concepts(self):
+        return self.matcher.concepts
+
+    def match(self, query):
+        """Concepts présents dans une question (voir ConceptMatcher.match)"""
+        return self.matcher.match(query)
+
+    def answer(self, concept):
+        """Réponse type d'un concept ou None"""
+        self.refresh()
+        return self._state[1].get(concept)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_concept_registry():
+    """Retourne le registre partagé du processus (chargé au premier appel)"""
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ConceptRegistry()
+
+    return _registry
@@ -0,0 +1,251 @@
+"""
+Corpus documentaire de l'assistant Kaizen
+Plusieurs PDF (manuel opératoire, documentation utilisateur...) interrogés
+ensemble. Le corpus est décrit par un manifeste JSON ou par un dossier de
+PDF (KAIZEN_CORPUS) ; par défaut, le manuel et la documentation utilisateur
+s'ils sont présents.
+
+Manifeste :
+    {"documents": [
+        {"id": "manuel", "label": "Manuel", "path": "Kaizen_-_Manuel_ope_ratoire.pdf"},
+        {"id": "doc_utilisateur", "label": "Doc utilisateur", "path": "Documentation_Utilisateur_KAIZEN.pdf"}
+    ]}
+
+Chaque document est suivi par son empreinte : quand un PDF change (ou
+qu'un document est ajouté / retiré), la nouvelle version du corpus est
+extraite et indexée en arrière-plan — seuls les documents modifiés sont
+relus — puis remplace l'ancienne, qui continue de servir les recherches
+en attendant.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+from kaizen_index import get_index
+from kaizen_store import MANUAL_FILENAME, USER_DOC_FILENAME, find_document_path, get_page_store, replace_page_store
+
+# Manifeste JSON ou dossier de PDF ; None = documents par défaut
+CORPUS_SOURCE = os.environ.get('KAIZEN_CORPUS')
+
+# Délai minimal entre deux vérifications des fichiers du corpus (secondes)
+REFRESH_INTERVAL = float(os.environ.get('KAIZEN_CORPUS_REFRESH', 30))
+
+# Documents connus : nom de fichier → (identifiant, libellé affiché)
+KNOWN_DOCUMENTS = {
+    MANUAL_FILENAME: ('manuel', 'Manuel'),
+    USER_DOC_FILENAME: ('doc_utilisateur', 'Doc utilisateur'),
+}
+
+ID_RE = re.compile(r'[^a-z0-9]+')
+
+# id    : identifiant court, stable (utilisé dans les passages de l'index)
+# label : libellé des références affichées ('Manuel p.42')
+# path  : chemin du PDF
+# store : PageStore du PDF
+Document = namedtuple('Document', 'id label path store')
+
+
+def _describe(path):
+    """Identifiant et libellé d'un PDF d'après son nom de fichier"""
+    filename = os.path.basename(path)
+    if filename in KNOWN_DOCUMENTS:
+        return KNOWN_DOCUMENTS[filename]
+    stem = os.path.splitext(filename)[0]
+    label = re.sub(r'[_-]+', ' ', stem).strip()
+    return ID_RE.sub('_', stem.lower()).strip('_') or 'document', label or filename
+
+
+def list_documents(source=CORPUS_SOURCE):
+    """
+    Documents décrits par une source de corpus
+
+    Args:
+        source: Manifeste JSON, dossier de PDF, ou None pour les documents
+            par défaut (ceux de KNOWN_DOCUMENTS trouvés dans DOCUMENT_DIRS)
+
+    Returns:
+        list: [(identifiant, libellé, chemin)] dans l'ordre de la source
+    """
+    entries = []
+    if source is None:
+        for filename in KNOWN_DOCUMENTS:
+            path = find_document_path(filename)
+            if path:
+                entries.append((*_describe(path), path))
+    elif os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if filename.lower().endswith('.pdf'):
+                path = os.path.join(source, filename)
+                entries.append((*_describe(path), path))
+    else:
+        try:
+            with open(source, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return []
+        base_dir = os.path.dirname(os.path.abspath(source))
+        for item in manifest.get('documents', []):
+            path = os.path.join(base_dir, item['path'])
+            doc_id, label = _describe(path)
+            entries.append((item.get('id', doc_id), item.get('label', label), path))
+
+    # Identifiants uniques : 'manuel', 'manuel_2'...
+    seen = set()
+    documents = []
+    for doc_id, label, path in entries:
+        unique_id, number = doc_id, 1
+        while unique_id in seen:
+            number += 1
+            unique_id = f"{doc_id}_{number}"
+        seen.add(unique_id)
+        documents.append((unique_id, label, path))
+    return documents
+
+
+class CorpusVersion:
+    """
+    État figé du corpus : ses documents et leur empreinte globale
+
+    Une version ne change jamais ; les index (lexical, vectoriel) et le
+    cache des réponses sont associés à son empreinte.
+    """
+
+    def __init__(self, documents):
+        self.documents = tuple(documents)
+        self._by_id = {doc.id: doc for doc in self.documents}
+        self._content_hash = None
+
+    def available_documents(self):
+        """Documents dont les pages ont pu être extraites"""
+        return [doc for doc in self.documents if doc.store.get_pages() is not None]
+
+    @property
+    def content_hash(self):
+        """
+        Empreinte du corpus, calculée à partir de l'empreinte des fichiers
+        sans attendre l'extraction (None si aucun document n'est présent)
+        """
+        if self._content_hash is None:
+            parts = []
+            for doc in self.documents:
+                doc_hash = doc.store.identify()
+                if doc_hash:
+                    parts.append(f"{doc.id}:{doc_hash}")
+            if parts:
+                self._content_hash = hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+        return self._content_hash
+
+    def page_text(self, doc_id, page):
+        return self._by_id[doc_id].store.page_text(page)
+
+    def reference(self, doc_id, page):
+        """Référence affichable d'une page : 'Manuel p.42'"""
+        return f"{self._by_id[doc_id].label} p.{page}"
+
+
+class Corpus:
+    """
+    Corpus du processus, rechargé en arrière-plan quand ses fichiers changent
+
+    `current` est toujours une version complète et indexée (sauf au premier
+    chargement, indexé à la première recherche) : les sessions la lisent
+    sans verrou.
+    """
+
+    def __init__(self, source=CORPUS_SOURCE, refresh_interval=REFRESH_INTERVAL):
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.current = CorpusVersion(self._documents({}))
+        self.last_reload = None
+        self._checked_at = time.monotonic()
+        self._reindexing = None
+        self._retired = []
+        self._lock = threading.Lock()
+
+    def _documents(self, previous):
+        """
+        Documents de la source ; le store d'un document inchangé est
+        réutilisé, celui d'un document nouveau ou modifié est recréé
+        """
+        documents = []
+        for doc_id, label, path in list_documents(self.source):
+            old = previous.get(doc_id)
+            if old is not None and old.path == path:
+                store = old.store
+            else:
+                store = get_page_store(path)
+            if store.is_stale():
+                store = replace_page_store(path)
+            documents.append(Document(doc_id, label, path, store))
+        return documents
+
+    @property
+    def reindexing(self):
+        return self._reindexing is not None and self._reindexing.is_alive()
+
+    def refresh(self, force=False):
+        """
+        Vérifie les fichiers du corpus (au plus toutes les `refresh_interval`
+        secondes) et lance la réindexation en arrière-plan s'ils ont changé
+
+        Returns:
+            bool: True si une réindexation a été lancée
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return False
+
+        with self._lock:
+            if self.reindexing:
+                return False
+            self._checked_at = now
+
+            current = self.current.documents
+            documents = self._documents({doc.id: doc for doc in current})
+            unchanged = [(d.id, d.label, d.store) for d in documents] == [(d.id, d.label, d.store) for d in current]
+            if unchanged:
+                return False
+
+            self._reindexing = threading.Thread(
+                target=self._reindex, args=(documents,), name='kaizen-corpus-reindex', daemon=True
+            )
+            self._reindexing.start()
+            return True
+
+    def _reindex(self, documents):
+        """Extrait et indexe la nouvelle version, puis la publie"""
+        version = CorpusVersion(documents)
+        get_index(version)
+        previous, self.current = self.current, version
+        self.last_reload = time.time()
+
+        # Stores des documents modifiés ou retirés : la version précédente,
+        # encore tenue par les requêtes en cours, les lit toujours. Ils ne
+        # sont fermés qu'à la réindexation suivante, sauf si la version
+        # publiée les a repris (document retiré puis remis).
+        kept = {id(doc.store) for doc in documents}
+        for store in self._retired:
+            if id(store) not in kept:
+                store.close()
+        self._retired = [doc.store for doc in previous.documents if id(doc.store) not in kept]
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+
+def get_corpus():
+    """Retourne le corpus partagé du processus"""
+    global _corpus
+
+    if _corpus is None:
+        with _corpus_lock:
+            if _corpus is None:
+                _corpus = Corpus()
+
+    return _corpus
@@ -0,0 +1,223 @@
+"""
+Historique des questions en journal JSON Lines
+Une ligne par question, ajoutée en fin de fichier (jamais de réécriture
+complète), un fichier par utilisateur, avec rotation des journaux trop
+volumineux et lecture des dernières entrées depuis la fin du fichier
+"""
+
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou de processus uniquement
+    fcntl = None
+
+HISTORY_DIR = os.environ.get('KAIZEN_HISTORY_DIR', 'chat_history')
+LEGACY_HISTORY_FILE = "chat_history.json"
+
+# Rotation : taille maximale du journal actif et nombre d'archives conservées
+MAX_LOG_BYTES = int(os.environ.get('KAIZEN_HISTORY_MAX_BYTES', 5 * 1024 * 1024))
+MAX_ARCHIVES = int(os.environ.get('KAIZEN_HISTORY_ARCHIVES', 5))
+
+USER_RE = re.compile(r'[^A-Za-z0-9_.-]')
+
+# Verrous par fichier et nombre de lignes déjà comptées, partagés par le processus
+_locks = {}
+_line_counts = {}
+_registry_lock = threading.Lock()
+
+
+def _file_lock(path):
+    with _registry_lock:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = threading.Lock()
+            _locks[path] = lock
+    return lock
+
+
+def _count_lines(path):
+    """
+    Nombre de lignes d'un fichier
+
+    Le résultat est mémorisé avec l'inode et la taille du fichier : si le
+    même fichier a seulement grandi, seuls les octets ajoutés sont relus.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 0
+
+    inode, known_size, known_count = _line_counts.get(path, (None, 0, 0))
+    if inode != stat.st_ino or stat.st_size < known_size:
+        known_size, known_count = 0, 0
+
+    if stat.st_size > known_size:
+        with open(path, 'rb') as f:
+            f.seek(known_size)
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                known_count += block.count(b'\n')
+        _line_counts[path] = (stat.st_ino, stat.st_size, known_count)
+
+    return known_count
+
+
+def _tail_file(path, n):
+    """Dernières entrées d'un journal, lues par blocs depuis la fin du fichier"""
+    if n <= 0:
+        return []
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b''
+            while position > 0 and data.count(b'\n') <= n:
+                step = min(8192, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+    except OSError:
+        return []
+
+    entries = []
+    for line in data.splitlines()[-n:]:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            # Première ligne coupée par la lecture par blocs
+            continue
+    return entries
+
+
+class HistoryStore:
+    """
+    Journal des questions d'un utilisateur
+
+    Chaque ajout est une seule écriture en mode O_APPEND, protégée par un
+    verrou de fichier entre processus : deux sessions qui écrivent en même
+    temps ne peuvent ni s'écraser ni entrelacer leurs lignes.
+    """
+
+    def __init__(self, user='default', directory=HISTORY_DIR):
+        self.user = USER_RE.sub('_', user) or 'default'
+        self.directory = directory
+        self.path = os.path.join(directory, f"{self.user}.jsonl")
+
+    def _archive_path(self, number):
+        return os.path.join(self.directory, f"{self.user}.{number}.jsonl")
+
+    @contextmanager
+    def _locked(self):
+        """
+        Verrou exclusif du journal actif, entre threads et entre processus
+
+        Yields:
+            int: Descripteur du journal actif, ouvert en ajout
+        """
+        with _file_lock(self.path):
+            while True:
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                # Un autre processus a pu archiver ou supprimer le journal
+                # pendant l'attente du verrou : on verrouille le nouveau
+                try:
+                    if os.stat(self.path).st_ino == os.fstat(fd).st_ino:
+                        break
+                except FileNotFoundError:
+                    pass
+                os.close(fd)
+            try:
+                yield fd
+            finally:
+                os.close(fd)
+
+    def append(self, entry):
+        """Ajoute une entrée en fin de journal (les erreurs d'écriture sont ignorées)"""
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with self._locked() as fd:
+                os.write(fd, line)
+                if os.fstat(fd).st_size > MAX_LOG_BYTES:
+                    self._rotate()
+        except OSError:
+            pass
+
+    def _rotate(self):
+        """Archive le journal actif : user.jsonl → user.1.jsonl → user.2.jsonl ..."""
+        oldest = self._archive_path(MAX_ARCHIVES)
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for number in range(MAX_ARCHIVES - 1, 0, -1):
+            archive = self._archive_path(number)
+            if os.path.exists(archive):
+                os.replace(archive, self._archive_path(number + 1))
+        os.replace(self.path, self._archive_path(1))
+
+    def tail(self, n):
+        """
+        Dernières entrées, lues depuis la fin du journal actif puis, s'il en
+        contient moins de n (juste après une rotation), des archives
+
+        Returns:
+            list: Au plus n entrées, de la plus ancienne à la plus récente
+        """
+        entries = []
+        for path in [self.path] + [self._archive_path(number) for number in range(1, MAX_ARCHIVES + 1)]:
+            if len(entries) >= n:
+                break
+            entries = _tail_file(path, n - len(entries)) + entries
+        return entries
+
+    def count(self):
+        """Nombre total de questions (journal actif et archives)"""
+        total = _count_lines(self.path)
+        for number in range(1, MAX_ARCHIVES + 1):
+            total += _count_lines(self._archive_path(number))
+        return total
+
+    def clear(self):
+        """Supprime le journal et les archives de l'utilisateur"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with self._locked():
+                for path in [self.path] + [self._archive_path(n) for n in range(1, MAX_ARCHIVES + 1)]:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+
+    def import_legacy(self, legacy_file=LEGACY_HISTORY_FILE):
+        """
+        Reprend une seule fois l'ancien historique JSON (liste complète)
+
+        La reprise se fait sous le verrou du journal ; le fichier est ensuite
+        renommé en <fichier>.imported, qui sert de marqueur : un historique
+        effacé par clear() n'est pas réimporté, et deux sessions qui
+        démarrent ensemble ne l'importent pas deux fois.
+        """
+        if not os.path.exists(legacy_file):
+            return
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with self._locked() as fd:
+                # Une autre session a pu faire la reprise pendant l'attente du verrou
+                if not os.path.exists(legacy_file):
+                    return
+                # Journal déjà alimenté par une reprise d'avant le marqueur : rien à ajouter
+                if not self.count():
+                    with open(legacy_file, 'r', encoding='utf-8') as f:
+                        entries = json.load(f)
+                    os.write(fd, ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in entries).encode('utf-8'))
+                os.replace(legacy_file, legacy_file + '.imported')
+        except (OSError, ValueError):
+            pass
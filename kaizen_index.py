@@ -0,0 +1,414 @@
+"""
+Index inversé du corpus Kaizen
+Construit une seule fois au chargement des pages : la recherche ne parcourt
+que les listes de postings des termes de la question et retourne directement
+les meilleurs passages
+
+Chaque document du corpus a son propre index (segment), mis en cache selon
+le contenu du PDF ; l'index du corpus est la fusion des segments. Quand un
+seul document change, seul son segment est reconstruit.
+"""
+
+import heapq
+import math
+import os
+import threading
+import time
+
+from kaizen_metrics import timed, timer
+from kaizen_passages import classify_lines, split_pages
+from kaizen_store import read_cache, write_cache
+from kaizen_text import analyze, analyze_query
+
+# À incrémenter à chaque changement de la structure de l'index
+INDEX_VERSION = 6
+
+# Modes de classement disponibles
+#   count    : somme brute des occurrences (comportement historique)
+#   bm25     : BM25 sur le texte du passage
+#   bm25f    : BM25F, le titre de la section pèse plus que le corps
+#   semantic : similarité d'embeddings (voir kaizen_vectors)
+#   hybrid   : fusion des classements bm25f et semantic
+LEXICAL_RANKINGS = ('count', 'bm25', 'bm25f')
+RANKING_MODES = LEXICAL_RANKINGS + ('semantic', 'hybrid')
+DEFAULT_RANKING = os.environ.get('KAIZEN_RANKING', 'bm25f')
+
+# Paramètres BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+HEADING_BOOST = 3.0
+
+
+class InvertedIndex:
+    """
+    Index inversé terme → postings sur les passages d'un document ou d'un corpus
+
+    Chaque posting est un tuple (identifiant de passage, fréquence dans le
+    corps, fréquence dans le titre de section). Les longueurs de documents,
+    les IDF et les normes de longueur sont calculés une fois à la construction.
+    """
+
+    def __init__(self, pages=None):
+        self.passages = []
+        self.line_kinds = []  # catégories des lignes de chaque passage (voir classify_lines)
+        self.postings = {}
+        self.body_lengths = {}
+        self.heading_lengths = {}
+
+        if pages is None:
+            return
+
+        self.passages = split_pages(pages)
+        for passage in self.passages:
+            body = pages[passage.page][passage.start:passage.end]
+            heading_terms = analyze(passage.heading)
+            body_terms = analyze(body)
+            self.line_kinds.append(classify_lines(body))
+            self.heading_lengths[passage.id] = len(heading_terms)
+            self.body_lengths[passage.id] = len(body_terms)
+
+            counts = {}
+            for term in body_terms:
+                tf_body, tf_heading = counts.get(term, (0, 0))
+                counts[term] = (tf_body + 1, tf_heading)
+            for term in heading_terms:
+                tf_body, tf_heading = counts.get(term, (0, 0))
+                counts[term] = (tf_body, tf_heading + 1)
+            for term, (tf_body, tf_heading) in counts.items():
+                self.postings.setdefault(term, []).append((passage.id, tf_body, tf_heading))
+
+        self._compute_statistics()
+
+    @classmethod
+    def merge(cls, segments):
+        """
+        Index d'un corpus à partir des index de ses documents
+
+        Les passages sont renumérotés à la suite les uns des autres et
+        marqués avec leur document ; seules les statistiques globales (IDF,
+        longueurs moyennes) sont recalculées, les textes ne sont pas relus.
+
+        Args:
+            segments: [(identifiant de document, InvertedIndex du document)]
+        """
+        index = cls()
+        for doc, segment in segments:
+            offset = len(index.passages)
+            index.passages.extend(p._replace(id=p.id + offset, doc=doc) for p in segment.passages)
+            index.line_kinds.extend(segment.line_kinds)
+            for term, plist in segment.postings.items():
+                index.postings.setdefault(term, []).extend(
+                    (doc_id + offset, tf_body, tf_heading) for doc_id, tf_body, tf_heading in plist
+                )
+            index.body_lengths.update((doc_id + offset, n) for doc_id, n in segment.body_lengths.items())
+            index.heading_lengths.update((doc_id + offset, n) for doc_id, n in segment.heading_lengths.items())
+
+        index._compute_statistics()
+        return index
+
+    def _compute_statistics(self):
+        """Précalcule IDF et normes de longueur pour BM25 / BM25F"""
+        doc_count = len(self.body_lengths) or 1
+
+        self.idf = {
+            term: math.log(1 + (doc_count - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+        avg_body = sum(self.body_lengths.values()) / doc_count or 1
+        avg_heading = sum(self.heading_lengths.values()) / doc_count or 1
+
+        # BM25 : tout le passage est un seul champ
+        avg_total = avg_body + avg_heading
+        self.bm25_norms = {
+            doc_id: BM25_K1 * (1 - BM25_B + BM25_B * (length + self.heading_lengths[doc_id]) / avg_total)
+            for doc_id, length in self.body_lengths.items()
+        }
+
+        # BM25F : normalisation de longueur propre à chaque champ
+        self.body_norms = {
+            doc_id: 1 - BM25_B + BM25_B * length / avg_body
+            for doc_id, length in self.body_lengths.items()
+        }
+        self.heading_norms = {
+            doc_id: 1 - BM25_B + BM25_B * length / avg_heading
+            for doc_id, length in self.heading_lengths.items()
+        }
+
+    def search(self, query, limit=5, ranking=DEFAULT_RANKING):
+        """
+        Score des passages pour une question
+
+        Args:
+            query: Question de l'utilisateur
+            limit: Nombre maximum de passages retournés
+            ranking: Mode de classement lexical (voir LEXICAL_RANKINGS)
+
+        Returns:
+            list: [(identifiant de passage, score)] triés par score décroissant
+        """
+        if ranking not in LEXICAL_RANKINGS:
+            raise ValueError(f"Mode de classement inconnu : {ranking}")
+
+        terms = analyze_query(query)
+        if ranking == 'count':
+            scores = self._score_count(terms)
+        elif ranking == 'bm25':
+            scores = self._score_bm25(set(terms))
+        else:
+            scores = self._score_bm25f(set(terms))
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def _score_count(self, terms):
+        scores = {}
+        for term in terms:
+            for doc_id, tf_body, tf_heading in self.postings.get(term, ()):
+                scores[doc_id] = scores.get(doc_id, 0) + tf_body + tf_heading
+        return scores
+
+    def _score_bm25(self, terms):
+        scores = {}
+        norms = self.bm25_norms
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf_body, tf_heading in self.postings[term]:
+                tf = tf_body + tf_heading
+                scores[doc_id] = scores.get(doc_id, 0) + idf * tf * (BM25_K1 + 1) / (tf + norms[doc_id])
+        return scores
+
+    def _score_bm25f(self, terms):
+        scores = {}
+        body_norms = self.body_norms
+        heading_norms = self.heading_norms
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf_body, tf_heading in self.postings[term]:
+                tf = tf_body / body_norms[doc_id]
+                if tf_heading:
+                    tf += HEADING_BOOST * tf_heading / heading_norms[doc_id]
+                scores[doc_id] = scores.get(doc_id, 0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1)
+        return scores
+
+
+# Index du processus, un par version du corpus (les plus récentes seulement)
+INDEX_VERSIONS_KEPT = 2
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# Pendant la première construction : index partiel publié au fil de
+# l'extraction (au plus toutes les PARTIAL_PUBLISH_INTERVAL secondes) et
+# événement posé dès qu'un index, partiel ou complet, est interrogeable
+PARTIAL_PUBLISH_INTERVAL = 1.0
+PARTIAL_WAIT = float(os.environ.get('KAIZEN_PARTIAL_WAIT', 10))
+_partial_indexes = {}
+_builds = {}
+_builds_lock = threading.Lock()
+
+
+def get_segment(page_store, on_progress=None):
+    """
+    Index d'un seul document (relu du cache disque ou construit)
+
+    Pendant une extraction par tranches, chaque tranche est indexée dès
+    qu'elle arrive : `on_progress` reçoit la liste des index de tranches
+    déjà construits.
+
+    Returns:
+        InvertedIndex ou None si les pages ne sont pas disponibles
+    """
+    key = page_store.identify()
+    if key is None:
+        return None
+
+    kind = f"segment{INDEX_VERSION}"
+    segment = read_cache(kind, key)
+    if segment is not None:
+        return segment
+
+    parts = []
+
+    def on_range(pages):
+        parts.append(InvertedIndex(pages))
+        if on_progress:
+            on_progress(parts)
+
+    pages = page_store.get_pages(on_range)
+    if pages is None:
+        return None
+
+    # Les tranches arrivent dans l'ordre des pages : la fusion donne la
+    # même numérotation des passages qu'un index construit d'un bloc
+    segment = InvertedIndex.merge((None, part) for part in parts) if parts else InvertedIndex(pages)
+    write_cache(kind, key, segment)
+    return segment
+
+
+def _build_event(key):
+    with _builds_lock:
+        event = _builds.get(key)
+        if event is None:
+            event = threading.Event()
+            _builds[key] = event
+        return event
+
+
+def get_index(corpus, wait=True, on_segment=None):
+    """
+    Retourne l'index partagé d'une version du corpus
+
+    Args:
+        corpus: CorpusVersion (voir kaizen_corpus)
+        wait: Si False et que l'index n'est pas encore construit, lance la
+            construction en arrière-plan et retourne l'index partiel des
+            pages déjà extraites (attendu au plus PARTIAL_WAIT secondes)
+        on_segment: Fonction appelée avec l'identifiant de chaque document
+            dès que son index est prêt, si la construction a lieu dans cet
+            appel (rien n'est appelé si l'index est relu du cache)
+
+    Returns:
+        InvertedIndex ou None si aucun document n'est disponible
+    """
+    key = corpus.content_hash
+    if key is None:
+        return None
+
+    index = _indexes.get(key)
+    if index is not None:
+        return index
+
+    if not wait:
+        with _builds_lock:
+            building = key in _builds
+        event = _build_event(key)
+        if not building:
+            threading.Thread(target=get_index, args=(corpus,), name='kaizen-index', daemon=True).start()
+        event.wait(PARTIAL_WAIT)
+        return _indexes.get(key) or _partial_indexes.get(key)
+
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            event = _build_event(key)
+            try:
+                index = _build_index(corpus, key, event, on_segment)
+            finally:
+                with _builds_lock:
+                    _builds.pop(key, None)
+                _partial_indexes.pop(key, None)
+                event.set()
+
+    return index
+
+
+@timed('index')
+def _build_index(corpus, key, event, on_segment=None):
+    """Construit l'index d'une version (appelé sous _indexes_lock)"""
+    kind = f"index{INDEX_VERSION}"
+    index = read_cache(kind, key)
+    if index is None:
+        segments = []
+        last_publish = [0.0]
+
+        def publish(doc_id, parts):
+            now = time.monotonic()
+            if now - last_publish[0] < PARTIAL_PUBLISH_INTERVAL:
+                return
+            last_publish[0] = now
+            _partial_indexes[key] = InvertedIndex.merge(segments + [(doc_id, part) for part in parts])
+            event.set()
+
+        for doc in corpus.documents:
+            segment = get_segment(doc.store, lambda parts, doc_id=doc.id: publish(doc_id, parts))
+            if segment is not None:
+                segments.append((doc.id, segment))
+            if on_segment:
+                on_segment(doc.id)
+
+        index = InvertedIndex.merge(segments)
+        write_cache(kind, key, index)
+
+    _indexes[key] = index
+    while len(_indexes) > INDEX_VERSIONS_KEPT:
+        del _indexes[next(iter(_indexes))]
+    return index
+
+
+def index_ready(corpus):
+    """L'index complet de cette version du corpus est-il construit ?"""
+    return corpus.content_hash in _indexes
+
+
+def search_passages(corpus, query, limit=5, ranking=DEFAULT_RANKING, timings=None, wait=True):
+    """
+    Recherche les passages les plus pertinents pour une question
+
+    Args:
+        corpus: CorpusVersion (voir kaizen_corpus)
+        query: Question de l'utilisateur
+        limit: Nombre maximum de résultats
+        ranking: Mode de classement (voir RANKING_MODES)
+        timings: Dictionnaire complété avec la durée des étapes (ms)
+        wait: Si False, une recherche lexicale pendant la première
+            indexation porte sur les pages déjà extraites (voir get_index)
+
+    Returns:
+        list: [{'doc', 'page', 'ref', 'score', 'text', 'passage', 'line', 'line_kinds'}]
+        (au plus `limit` résultats, 'text' ne contient que le passage)
+    """
+    if ranking not in RANKING_MODES:
+        raise ValueError(f"Mode de classement inconnu : {ranking}")
+
+    # Les recherches vectorielles attendent l'index complet
+    index = get_index(corpus, wait=wait or ranking not in LEXICAL_RANKINGS)
+    if index is None:
+        return []
+
+    with timer('search', ranking=ranking):
+        start = time.perf_counter()
+        if ranking == 'semantic':
+            # numpy et le modèle d'embeddings ne sont chargés qu'à la demande
+            from kaizen_vectors import search_semantic
+            hits = search_semantic(corpus, query, limit)
+        elif ranking == 'hybrid':
+            from kaizen_vectors import search_hybrid
+            hits = search_hybrid(corpus, query, limit, timings=timings)
+        else:
+            hits = index.search(query, limit, ranking)
+
+        if timings is not None:
+            timings['search_ms'] = (time.perf_counter() - start) * 1000
+
+        return passage_results(corpus, index, hits)
+
+
+def passage_results(corpus, index, hits):
+    """
+    Résultats de recherche au format attendu par la synthèse
+
+    Args:
+        hits: [(identifiant de passage, score)]
+
+    Returns:
+        list: [{'doc', 'page', 'ref', 'score', 'text', 'passage', 'line', 'line_kinds'}],
+        'ref' est la référence affichable ('Manuel p.42'), 'line_kinds' les
+        catégories des lignes du passage calculées à l'indexation
+    """
+    results = []
+    for doc_id, score in hits:
+        passage = index.passages[doc_id]
+        results.append({
+            'doc': passage.doc,
+            'page': passage.page,
+            'ref': corpus.reference(passage.doc, passage.page),
+            'score': score,
+            'text': corpus.page_text(passage.doc, passage.page)[passage.start:passage.end],
+            'passage': passage.id,
+            'line': passage.line_start,
+            'line_kinds': index.line_kinds[passage.id],
+        })
+    return results
@@ -0,0 +1,200 @@
+"""
+Rédaction des réponses par un modèle de langage local (optionnel)
+Un petit modèle quantifié (format GGUF, llama.cpp) tourne sur le CPU du
+serveur, sans réseau : il reçoit les passages les mieux classés et rédige
+la réponse, transmise morceau par morceau à l'interface au fil de la
+génération (la réponse commence à s'afficher en quelques centaines de
+millisecondes au lieu d'attendre la génération complète).
+
+Activation :
+    pip install llama-cpp-python
+    export KAIZEN_LLM_MODEL=/chemin/vers/modele.gguf
+
+Sans modèle configuré (ou sans llama-cpp-python), l'assistant garde la
+synthèse extractive.
+
+Une génération occupe plusieurs cœurs pendant plusieurs secondes : au plus
+KAIZEN_LLM_CONCURRENCY générations simultanées (une instance du modèle
+chacune), les suivantes attendent leur tour dans une file limitée à
+KAIZEN_LLM_QUEUE questions et KAIZEN_LLM_QUEUE_TIMEOUT secondes. Au-delà,
+LLMBusy est levée et l'appelant répond avec la synthèse extractive.
+"""
+
+import importlib.util
+import os
+import queue
+import threading
+
+from kaizen_metrics import increment, timer
+
+MODEL_PATH = os.environ.get('KAIZEN_LLM_MODEL')
+MODEL_NAME = os.path.splitext(os.path.basename(MODEL_PATH))[0] if MODEL_PATH else None
+
+CONCURRENCY = max(1, int(os.environ.get('KAIZEN_LLM_CONCURRENCY', 1)))
+MAX_QUEUE = int(os.environ.get('KAIZEN_LLM_QUEUE', 4))
+QUEUE_TIMEOUT = float(os.environ.get('KAIZEN_LLM_QUEUE_TIMEOUT', 60))
+
+# Paramètres du modèle : les cœurs sont partagés entre les instances
+CONTEXT_TOKENS = int(os.environ.get('KAIZEN_LLM_CONTEXT', 2048))
+MAX_TOKENS = int(os.environ.get('KAIZEN_LLM_MAX_TOKENS', 400))
+THREADS = int(os.environ.get('KAIZEN_LLM_THREADS', 0)) or max(1, (os.cpu_count() or 1) // CONCURRENCY)
+TEMPERATURE = 0.2
+
+# Taille maximale des extraits transmis au modèle (environ 4 caractères par
+# token : le contexte doit laisser la place à la réponse)
+CONTEXT_CHARS = int(os.environ.get('KAIZEN_LLM_CONTEXT_CHARS', 5000))
+
+SYSTEM_PROMPT = (
+    "Tu es l'assistant du logiciel Kaizen. Réponds en français, de façon "
+    "concise et structurée (étapes numérotées pour une procédure), uniquement "
+    "à partir des extraits de documentation fournis. Cite les références entre "
+    "parenthèses, par exemple (Manuel p.42). Si les extraits ne permettent pas "
+    "de répondre, dis-le et propose de créer un ticket Freshdesk."
+)
+
+
+class LLMBusy(Exception):
+    """File d'attente pleine ou attente trop longue : pas de génération"""
+
+
+def available():
+    """Un modèle est-il configuré et llama-cpp-python installé ?"""
+    return bool(MODEL_PATH) and os.path.exists(MODEL_PATH) and importlib.util.find_spec('llama_cpp') is not None
+
+
+def build_messages(query, passages, max_chars=CONTEXT_CHARS):
+    """
+    Messages de chat : consignes, extraits (dans l'ordre du classement,
+    dans la limite de `max_chars`) et question
+
+    Args:
+        passages: Résultats de recherche ({'ref', 'text'}, voir search_passages)
+    """
+    extracts = []
+    used = 0
+    for result in passages:
+        text = ' '.join(result['text'].split())
+        if extracts and used + len(text) > max_chars:
+            break
+        text = text[:max_chars - used]
+        extracts.append(f"[{result['ref']}]\n{text}")
+        used += len(text)
+
+    return [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': "Extraits de la documentation :\n\n" + "\n\n".join(extracts) + f"\n\nQuestion : {query}"},
+    ]
+
+
+class ModelPool:
+    """
+    Instances du modèle partagées par les sessions du processus
+
+    Une instance ne génère qu'une réponse à la fois ; le sémaphore limite les
+    générations simultanées et `waiting` la longueur de la file d'attente.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, concurrency=CONCURRENCY, max_queue=MAX_QUEUE):
+        self.model_path = model_path
+        self.max_queue = max_queue
+        self.running = 0
+        self.waiting = 0
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        from llama_cpp import Llama
+        return Llama(model_path=self.model_path, n_ctx=CONTEXT_TOKENS, n_threads=THREADS, verbose=False)
+
+    def acquire(self, timeout=QUEUE_TIMEOUT):
+        """
+        Attend une place libre et retourne une instance du modèle
+
+        Raises:
+            LLMBusy: File pleine ou pas de place libérée avant `timeout`
+        """
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                increment('llm_rejected', reason='queue_full')
+                raise LLMBusy(f"{self.waiting} questions en attente du modèle")
+            self.waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            increment('llm_rejected', reason='timeout')
+            raise LLMBusy(f"Aucune place libérée en {timeout:.0f} s")
+
+        try:
+            try:
+                model = self._idle.get_nowait()
+            except queue.Empty:
+                with timer('llm_load'):
+                    model = self._load()
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.running += 1
+        return model
+
+    def release(self, model):
+        self._idle.put(model)
+        with self._lock:
+            self.running -= 1
+        self._slots.release()
+
+    def preload(self):
+        """Charge une instance à l'avance (préchauffage)"""
+        self.release(self.acquire())
+
+    def state(self):
+        return {'running': self.running, 'waiting': self.waiting}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_model_pool():
+    """Retourne le pool de modèles partagé du processus"""
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ModelPool()
+
+    return _pool
+
+
+def stream_answer(query, passages):
+    """
+    Réponse rédigée par le modèle, produite morceau par morceau
+
+    La place dans la file est prise au premier morceau demandé (LLMBusy est
+    levée à ce moment-là) et rendue à la fin de la génération, ou dès que
+    l'appelant abandonne le flux.
+
+    Yields:
+        str: Morceaux de texte de la réponse
+    """
+    pool = get_model_pool()
+    model = pool.acquire()
+    try:
+        with timer('generate'):
+            chunks = model.create_chat_completion(
+                messages=build_messages(query, passages),
+                max_tokens=MAX_TOKENS,
+                temperature=TEMPERATURE,
+                stream=True,
+            )
+            for chunk in chunks:
+                text = chunk['choices'][0]['delta'].get('content')
+                if text:
+                    yield text
+    finally:
+        pool.release(model)
@@ -0,0 +1,221 @@
+"""
+Instrumentation des étapes de l'assistant Kaizen
+Durées (histogrammes) et compteurs des étapes du chemin critique :
+extraction des PDF, construction de l'index, recherche (et ses étapes
+lexicale, vectorielle et de fusion en mode hybride), détection du concept,
+synthèse. Exposés au format texte Prometheus (/metrics de la sonde
+de disponibilité et de l'API) et, avec KAIZEN_METRICS_SIDEBAR=1, dans la
+barre latérale des applications.
+
+    with timer('search', ranking='bm25f'):
+        ...
+
+    @timed('synthesize')
+    def synthesize_answer(...):
+        ...
+
+Désactivée par défaut (KAIZEN_METRICS=1 pour l'activer) : timer() renvoie
+alors un gestionnaire de contexte vide partagé et timed() laisse la
+fonction telle quelle, le coût est négligeable.
+
+Les mesures sont propres au processus : avec plusieurs workers, chacun
+expose les siennes (Prometheus les agrège).
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import wraps
+
+ENABLED = os.environ.get('KAIZEN_METRICS', '0').lower() in ('1', 'true', 'yes', 'on')
+
+# Durées affichées dans la barre latérale des applications (si activée)
+SHOW_IN_SIDEBAR = ENABLED and os.environ.get('KAIZEN_METRICS_SIDEBAR', '0').lower() in ('1', 'true', 'yes', 'on')
+
+# Bornes des histogrammes de durée (secondes)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PREFIX = 'kaizen'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_NOOP = nullcontext()
+
+
+class Histogram:
+    """Répartition des durées d'une étape (une série par jeu d'étiquettes)"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # dernier : au-delà de la plus grande borne
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimation d'un quantile (interpolation linéaire dans la classe)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if count and seen + count >= target:
+                return lower + (upper - lower) * (target - seen) / count
+            seen += count
+            lower = upper
+        return self.buckets[-1]
+
+
+class Registry:
+    """Compteurs et histogrammes du processus"""
+
+    def __init__(self):
+        self.counters = {}    # (nom, étiquettes) → valeur
+        self.histograms = {}  # (étiquettes) → Histogram
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, stage, seconds, **labels):
+        key = tuple(sorted(dict(labels, stage=stage).items()))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+_registry = Registry()
+
+
+class _Timer:
+    __slots__ = ('stage', 'labels', 'start')
+
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _registry.observe(self.stage, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def timer(stage, **labels):
+    """Gestionnaire de contexte qui mesure la durée d'une étape"""
+    if not ENABLED:
+        return _NOOP
+    return _Timer(stage, labels)
+
+
+def timed(stage, **labels):
+    """Décorateur : mesure la durée de chaque appel de la fonction"""
+    def decorator(function):
+        if not ENABLED:
+            return function
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with _Timer(stage, labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe(stage, seconds, **labels):
+    """Enregistre une durée déjà mesurée (étape exécutée dans un autre thread)"""
+    if ENABLED:
+        _registry.observe(stage, seconds, **labels)
+
+
+def increment(name, value=1, **labels):
+    """Incrémente un compteur ('queries', cache='hit'...)"""
+    if ENABLED:
+        _registry.increment(name, value, **labels)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+def render_prometheus():
+    """
+    Mesures au format texte Prometheus (version 0.0.4)
+
+    Returns:
+        str: kaizen_stage_duration_seconds (histogramme par étape) et
+        kaizen_<nom>_total (compteurs)
+    """
+    with _registry._lock:
+        counters = sorted(_registry.counters.items())
+        histograms = sorted(
+            (key, list(h.counts), h.count, h.sum) for key, h in _registry.histograms.items()
+        )
+
+    lines = []
+    name = f"{PREFIX}_stage_duration_seconds"
+    lines.append(f"# HELP {name} Durée des étapes de l'assistant")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, counts, count, total in histograms:
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    declared = set()
+    for (counter, labels), value in counters:
+        metric = f"{PREFIX}_{counter}_total"
+        if metric not in declared:
+            declared.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def summary():
+    """
+    Résumé par étape pour l'affichage
+
+    Returns:
+        list: [(étape et étiquettes, appels, moyenne ms, p95 ms)] par étape
+    """
+    with _registry._lock:
+        items = [(key, h.count, h.sum, h.quantile(0.95)) for key, h in _registry.histograms.items()]
+
+    rows = []
+    for labels, count, total, p95 in items:
+        labels = dict(labels)
+        name = labels.pop('stage')
+        if labels:
+            name += ' (' + ', '.join(str(v) for _, v in sorted(labels.items())) + ')'
+        rows.append((name, count, total / count * 1000 if count else 0.0, p95 * 1000))
+    return sorted(rows)
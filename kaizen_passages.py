@@ -0,0 +1,164 @@
+"""
+Découpage du manuel en passages
+Chaque page est découpée une fois au chargement en paragraphes / sections
+repérés par leur page et leurs positions, pour que la recherche et la
+synthèse travaillent sur quelques centaines d'octets plutôt que sur des pages
+"""
+
+import re
+from collections import namedtuple
+
+# Taille cible d'un passage (en caractères)
+PASSAGE_MIN_CHARS = 200
+PASSAGE_MAX_CHARS = 800
+
+# id         : identifiant du passage dans l'index
+# page       : numéro de page
+# line_start : première ligne du passage dans la page (à partir de 1)
+# line_end   : dernière ligne du passage dans la page (incluse)
+# start, end : positions du passage dans le texte de la page
+# heading    : titre de la section à laquelle appartient le passage
+# doc        : identifiant du document du corpus (renseigné à la fusion des index)
+Passage = namedtuple('Passage', 'id page line_start line_end start end heading doc', defaults=(None,))
+
+
+# Catégories de lignes, calculées à l'indexation pour la synthèse (bits)
+LINE_STEP = 1         # étape numérotée : '1. ...', '2) ...', 'Étape 3 ...'
+LINE_DEFINITION = 2   # phrase définitoire : '... est ...', '... permet ...'
+LINE_NAVIGATION = 4   # chemin dans l'interface : onglet, menu, bouton...
+LINE_HEADING = 8      # titre de section
+
+STEP_RE = re.compile(r'^\d+[\.)]\s+|^Étape\s+\d+', re.IGNORECASE)
+DEFINITION_MARKERS = ('est', 'permet', 'désigne', 'correspond')
+NAVIGATION_KEYWORDS = ('onglet', 'menu', 'bouton', 'cliquer', 'accéder', 'rendez-vous')
+
+
+def is_heading(line):
+    """Une ligne courte entièrement en majuscules est considérée comme un titre"""
+    return len(line) <= 80 and any(c.isalpha() for c in line) and line.upper() == line
+
+
+def classify_line(line):
+    """Catégories d'une ligne (sans espaces de bord) : combinaison de LINE_*"""
+    line_lower = line.lower()
+    kind = 0
+    if STEP_RE.match(line):
+        kind |= LINE_STEP
+    if any(marker in line_lower for marker in DEFINITION_MARKERS):
+        kind |= LINE_DEFINITION
+    if any(keyword in line_lower for keyword in NAVIGATION_KEYWORDS):
+        kind |= LINE_NAVIGATION
+    if is_heading(line):
+        kind |= LINE_HEADING
+    return kind
+
+
+def _lines(text):
+    return [line.strip() for line in text.split('\n') if line.strip()]
+
+
+def classify_lines(text):
+    """
+    Catégories des lignes non vides d'un passage
+
+    Returns:
+        bytes: Un octet de catégories par ligne non vide, dans l'ordre
+    """
+    return bytes(classify_line(line) for line in _lines(text))
+
+
+def tagged_lines(text, kinds):
+    """
+    Lignes non vides d'un passage avec leurs catégories précalculées
+
+    Returns:
+        list: [(ligne sans espaces de bord, catégories)]
+    """
+    return list(zip(_lines(text), kinds))
+
+
+def _paragraphs(page_text):
+    """
+    Paragraphes d'une page (séparés par des lignes vides)
+
+    Les titres forment toujours un paragraphe à part et un paragraphe sans
+    ligne vide est coupé au-delà de PASSAGE_MAX_CHARS.
+
+    Returns:
+        list: [(ligne de début, ligne de fin, position de début, position de fin, est un titre)]
+    """
+    paragraphs = []
+    current = None
+    offset = 0
+
+    for line_num, line in enumerate(page_text.split('\n'), 1):
+        stripped = line.strip()
+        char_start, char_end = offset, offset + len(line)
+        offset = char_end + 1
+
+        if not stripped:
+            current = None
+            continue
+
+        heading = is_heading(stripped) or not paragraphs
+        too_long = current is not None and char_end - current[2] > PASSAGE_MAX_CHARS
+        if heading or too_long or current is None or current[4]:
+            current = [line_num, line_num, char_start, char_end, heading]
+            paragraphs.append(current)
+        else:
+            current[1] = line_num
+            current[3] = char_end
+
+    return paragraphs
+
+
+def split_page(page_num, page_text, first_id=0):
+    """
+    Découpe une page en passages
+
+    Les paragraphes sont regroupés jusqu'à PASSAGE_MIN_CHARS sans dépasser
+    PASSAGE_MAX_CHARS. Un titre (ligne en majuscules ou première ligne de la
+    page) démarre un nouveau passage et sert de titre aux passages suivants.
+
+    Returns:
+        list: [Passage]
+    """
+    passages = []
+    heading = ''
+    chunk = None
+
+    def flush():
+        if chunk is not None:
+            passages.append(Passage(first_id + len(passages), page_num, *chunk, heading))
+
+    for line_start, line_end, start, end, is_title in _paragraphs(page_text):
+        if is_title:
+            flush()
+            heading = page_text[start:end].strip()
+            chunk = [line_start, line_end, start, end]
+            continue
+
+        if chunk is not None and end - chunk[2] > PASSAGE_MAX_CHARS and chunk[3] - chunk[2] >= PASSAGE_MIN_CHARS:
+            flush()
+            chunk = None
+
+        if chunk is None:
+            chunk = [line_start, line_end, start, end]
+        else:
+            chunk[1], chunk[3] = line_end, end
+
+    flush()
+    return passages
+
+
+def split_pages(pages):
+    """
+    Découpe toutes les pages du manuel
+
+    Returns:
+        list: [Passage], l'identifiant d'un passage est sa position dans la liste
+    """
+    passages = []
+    for page_num, page_text in pages.items():
+        passages.extend(split_page(page_num, page_text, len(passages)))
+    return passages
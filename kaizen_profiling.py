@@ -0,0 +1,213 @@
+"""
+Profilage d'une question à la demande
+Quand une question est lente en production, on rejoue sa recherche et sa
+synthèse sous un traceur (sys.setprofile) qui enregistre chaque appel de
+fonction Python et de fonction native, puis on écrit le profil :
+
+    profiles/<date>-<question>.speedscope.json   à ouvrir sur https://www.speedscope.app
+    profiles/<date>-<question>.folded            piles repliées (flamegraph.pl, inferno)
+    profiles/index.jsonl                          une ligne par profil : fichier, question, durée
+
+Activation :
+    KAIZEN_PROFILE=1              toutes les questions (poste de développement)
+    KAIZEN_PROFILE_TOKEN=secret   puis ?profile=secret dans l'URL de l'application,
+                                  ou le paramètre profile=secret de l'API /synthesize
+
+Un profilage contourne le cache des réponses (la question est réellement
+recalculée) et ralentit fortement l'exécution : il n'est jamais actif sans
+l'une de ces deux options. Seul le thread de la question est tracé (pas les
+threads de la recherche hybride).
+"""
+
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from kaizen_text import fold
+
+PROFILE_DIR = os.environ.get('KAIZEN_PROFILE_DIR', 'profiles')
+PROFILE_ALL = os.environ.get('KAIZEN_PROFILE', '0').lower() in ('1', 'true', 'yes', 'on')
+PROFILE_TOKEN = os.environ.get('KAIZEN_PROFILE_TOKEN')
+
+SLUG_RE = re.compile(r'[^a-z0-9]+')
+
+_index_lock = threading.Lock()
+
+
+def requested(token=None):
+    """
+    Le profilage est-il demandé pour cette question ?
+
+    Args:
+        token: Valeur du paramètre ?profile= (comparée à KAIZEN_PROFILE_TOKEN
+            en temps constant)
+    """
+    if PROFILE_ALL:
+        return True
+    if not PROFILE_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'), PROFILE_TOKEN.encode('utf-8'))
+
+
+class Profiler:
+    """
+    Traceur des appels du thread courant
+
+    Chaque entrée / sortie de fonction est un événement horodaté (format
+    « evented » de speedscope) ; les piles repliées en sont déduites.
+    """
+
+    def __init__(self):
+        self.frames = []      # [{'name', 'file', 'line'}]
+        self._frame_ids = {}  # objet code ou fonction native → indice dans frames
+        self.events = []      # [(type 'O' / 'C', indice de frame, ns depuis le début)]
+        self._stack = []
+        self.start = self.end = 0
+
+    def _frame_id(self, key, name, file, line):
+        frame_id = self._frame_ids.get(key)
+        if frame_id is None:
+            frame_id = self._frame_ids[key] = len(self.frames)
+            self.frames.append({'name': name, 'file': file, 'line': line})
+        return frame_id
+
+    def _trace(self, frame, event, arg):
+        now = time.perf_counter_ns() - self.start
+        if event == 'call':
+            code = frame.f_code
+            frame_id = self._frame_id(code, getattr(code, 'co_qualname', code.co_name), code.co_filename, code.co_firstlineno)
+        elif event == 'c_call':
+            module = getattr(arg, '__module__', None) or ''
+            name = getattr(arg, '__qualname__', None) or getattr(arg, '__name__', repr(arg))
+            frame_id = self._frame_id(arg, f"{module}.{name}" if module else name, '<native>', 0)
+        else:  # return, c_return, c_exception
+            # Les fonctions déjà en cours au démarrage du traceur n'ont pas d'entrée
+            if self._stack:
+                self.events.append(('C', self._stack.pop(), now))
+            return
+        self._stack.append(frame_id)
+        self.events.append(('O', frame_id, now))
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        sys.setprofile(self._trace)
+        return self
+
+    def __exit__(self, *exc):
+        sys.setprofile(None)
+        self.end = time.perf_counter_ns() - self.start
+        while self._stack:
+            self.events.append(('C', self._stack.pop(), self.end))
+        return False
+
+    def speedscope(self, name):
+        """Profil au format speedscope (https://www.speedscope.app/file-format-schema.json)"""
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'kaizen_profiling',
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'evented',
+                'name': name,
+                'unit': 'nanoseconds',
+                'startValue': 0,
+                'endValue': self.end,
+                'events': [{'type': kind, 'frame': frame_id, 'at': at} for kind, frame_id, at in self.events],
+            }],
+        }
+
+    def collapsed(self):
+        """
+        Piles repliées : une ligne 'f1;f2;f3 durée' par pile, durée propre
+        (hors appels enfants) en microsecondes
+        """
+        totals = {}
+        stack = []
+        last = 0
+        for kind, frame_id, at in self.events:
+            if stack:
+                key = ';'.join(self.frames[i]['name'] for i in stack)
+                totals[key] = totals.get(key, 0) + at - last
+            last = at
+            if kind == 'O':
+                stack.append(frame_id)
+            elif stack:
+                stack.pop()
+        return ''.join(f"{key} {ns // 1000}\n" for key, ns in sorted(totals.items()) if ns >= 1000)
+
+
+class ProfileRun:
+    """Profil d'une question ; `path` est renseigné une fois le fichier écrit"""
+
+    def __init__(self, query, tags):
+        self.query = query
+        self.tags = tags
+        self.path = None
+        self.duration_ms = None
+
+
+def _slug(query):
+    return SLUG_RE.sub('-', fold(query)).strip('-')[:40] or 'question'
+
+
+def save(profiler, run, directory=PROFILE_DIR):
+    """
+    Écrit le profil (speedscope et piles repliées) et l'ajoute à l'index
+
+    Returns:
+        str: Chemin du fichier speedscope
+    """
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{_slug(run.query)}")
+    name = f"{run.query} ({', '.join(f'{k}={v}' for k, v in sorted(run.tags.items()))})" if run.tags else run.query
+
+    with open(stem + '.speedscope.json', 'w', encoding='utf-8') as f:
+        json.dump(profiler.speedscope(name), f, ensure_ascii=False)
+    with open(stem + '.folded', 'w', encoding='utf-8') as f:
+        f.write(profiler.collapsed())
+
+    entry = {
+        'timestamp': datetime.now().isoformat(),
+        'file': os.path.basename(stem) + '.speedscope.json',
+        'query': run.query,
+        'duration_ms': run.duration_ms,
+        **run.tags,
+    }
+    with _index_lock, open(os.path.join(directory, 'index.jsonl'), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    return stem + '.speedscope.json'
+
+
+@contextmanager
+def profiled(query, enabled=True, **tags):
+    """
+    Profile le bloc et écrit le profil, étiqueté avec la question
+
+    Args:
+        query: Question traitée (nom du profil et du fichier)
+        enabled: False : le bloc s'exécute normalement et reçoit None
+        tags: Informations ajoutées à l'index (mode de classement...)
+
+    Yields:
+        ProfileRun ou None
+    """
+    if not enabled:
+        yield None
+        return
+
+    run = ProfileRun(query, tags)
+    profiler = Profiler()
+    with profiler:
+        yield run
+    run.duration_ms = round(profiler.end / 1e6, 2)
+    try:
+        run.path = save(profiler, run)
+    except OSError as e:  # le profil ne doit pas faire échouer la question
+        print(f"⚠️ Profil non enregistré : {e}", file=sys.stderr)
@@ -0,0 +1,485 @@
+"""
+Stockage partagé des pages du manuel Kaizen
+Le texte du PDF est extrait une seule fois par processus et partagé
+(en lecture seule) entre toutes les sessions Streamlit et tous les reruns
+
+Les pages extraites sont enregistrées dans un fichier du cache (table des
+positions de chaque page puis textes UTF-8) relu en mmap : le texte d'une
+page n'est décodé que lorsqu'on le demande, et le système partage les
+pages mémoire entre les processus.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import mmap
+import pickle
+import re
+import struct
+import subprocess
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+from kaizen_metrics import timed
+
+MANUAL_FILENAME = "Kaizen_-_Manuel_ope_ratoire.pdf"
+USER_DOC_FILENAME = "Documentation_Utilisateur_KAIZEN.pdf"
+
+# Dossiers où chercher les PDF (local puis environnement d'upload)
+DOCUMENT_DIRS = ['.', '/mnt/user-data/uploads']
+
+# Emplacements possibles du manuel
+MANUAL_LOCATIONS = [os.path.join(d, MANUAL_FILENAME) for d in DOCUMENT_DIRS]
+
+
+# À incrémenter à chaque changement du format d'extraction ou du découpage
+EXTRACTOR_VERSION = 1
+
+# Répertoire du cache disque (extraction et structures dérivées)
+CACHE_DIR = os.environ.get('KAIZEN_CACHE_DIR', '.kaizen_cache')
+
+# Extraction parallèle : nombre de pdftotext simultanés et pages par tranche
+EXTRACT_WORKERS = int(os.environ.get('KAIZEN_EXTRACT_WORKERS', min(4, os.cpu_count() or 1)))
+EXTRACT_RANGE_PAGES = int(os.environ.get('KAIZEN_EXTRACT_RANGE_PAGES', 16))
+
+PAGES_RE = re.compile(r'^Pages:\s+(\d+)', re.MULTILINE)
+
+# Fichier de pages : en-tête (signature, nombre de pages), table des pages
+# (numéro, début, fin des octets du texte) puis textes UTF-8 concaténés
+PAGES_MAGIC = b'KZPAGES1'
+PAGES_HEADER = struct.Struct('<8sq')
+PAGE_ENTRY = struct.Struct('<iqq')
+
+
+def find_document_path(filename):
+    """Retourne le chemin d'un PDF dans DOCUMENT_DIRS ou None s'il est introuvable"""
+    for directory in DOCUMENT_DIRS:
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _sha256(path):
+    """Calcule le SHA-256 d'un fichier par blocs"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path):
+    """
+    Empreinte d'un fichier : taille, date de modification et SHA-256
+
+    Le SHA-256 est mémorisé dans le cache et n'est recalculé que si la
+    taille ou la date de modification changent.
+
+    Returns:
+        dict: {'size', 'mtime', 'sha256'}
+    """
+    stat = os.stat(path)
+    index_file = os.path.join(CACHE_DIR, 'fingerprints.json')
+    key = os.path.abspath(path)
+
+    try:
+        with open(index_file, 'r', encoding='utf-8') as f:
+            known = json.load(f)
+    except (OSError, ValueError):
+        known = {}
+
+    entry = known.get(key)
+    if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+        return entry
+
+    entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': _sha256(path)}
+    known[key] = entry
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _atomic_write(index_file, json.dumps(known).encode('utf-8'))
+    except OSError:
+        pass
+
+    return entry
+
+
+def _atomic_write(path, data):
+    """Écrit un fichier via un fichier temporaire pour ne jamais laisser de cache tronqué"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_cache(kind, content_hash):
+    """
+    Lit une entrée du cache disque
+
+    Args:
+        kind: Nature des données ('pages', 'index', ...)
+        content_hash: SHA-256 du PDF source
+
+    Returns:
+        L'objet mis en cache ou None (absent, illisible ou version différente)
+    """
+    path = cache_path(kind, content_hash)
+    try:
+        with gzip.open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+
+def write_cache(kind, content_hash, value):
+    """Enregistre une entrée du cache disque (les erreurs d'écriture sont ignorées)"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        data = gzip.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), compresslevel=1)
+        _atomic_write(cache_path(kind, content_hash), data)
+    except OSError:
+        pass
+
+
+def cache_path(kind, content_hash, extension='.pkl.gz'):
+    """Chemin d'une entrée du cache disque pour un contenu de PDF"""
+    return os.path.join(CACHE_DIR, f"{kind}-{content_hash[:32]}-v{EXTRACTOR_VERSION}{extension}")
+
+
+def write_pages_file(path, pages):
+    """Enregistre des pages {numéro: texte} au format fichier de pages"""
+    table = []
+    bodies = []
+    offset = 0
+    for page, text in pages.items():
+        data = text.encode('utf-8')
+        table.append(PAGE_ENTRY.pack(page, offset, offset + len(data)))
+        bodies.append(data)
+        offset += len(data)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    _atomic_write(path, PAGES_HEADER.pack(PAGES_MAGIC, len(table)) + b''.join(table) + b''.join(bodies))
+
+
+class MappedPages(Mapping):
+    """
+    Pages d'un fichier de pages, lues à la demande dans un mmap
+
+    Seule la table des positions est chargée en mémoire ; pages[n] décode
+    le texte de la page n à chaque accès.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count = PAGES_HEADER.unpack_from(self._mm, 0)
+        if magic != PAGES_MAGIC:
+            raise ValueError(f"Fichier de pages invalide : {path}")
+
+        base = PAGES_HEADER.size + count * PAGE_ENTRY.size
+        self._offsets = {}
+        for i in range(count):
+            page, start, end = PAGE_ENTRY.unpack_from(self._mm, PAGES_HEADER.size + i * PAGE_ENTRY.size)
+            self._offsets[page] = (base + start, base + end)
+
+        if self._offsets and max(end for _, end in self._offsets.values()) > len(self._mm):
+            raise ValueError(f"Fichier de pages tronqué : {path}")
+
+    def __getitem__(self, page):
+        start, end = self._offsets[page]
+        return self._mm[start:end].decode('utf-8')
+
+    def close(self):
+        self._mm.close()
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def __len__(self):
+        return len(self._offsets)
+
+
+def open_pages_file(path):
+    """Ouvre un fichier de pages (None s'il est absent ou invalide)"""
+    try:
+        return MappedPages(path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def pdf_page_count(pdf_path):
+    """Nombre de pages d'un PDF selon pdfinfo (None si pdfinfo échoue)"""
+    try:
+        result = subprocess.run(
+            ['pdfinfo', pdf_path], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    match = PAGES_RE.search(result.stdout)
+    return int(match.group(1)) if match else None
+
+
+class PageStore:
+    """
+    Pages d'un PDF, extraites à la première demande
+
+    L'initialisation est paresseuse et protégée par un verrou : si plusieurs
+    sessions demandent les pages en même temps, une seule lance pdftotext.
+    Les pages sont exposées via un mapping en lecture seule.
+
+    Un PDF de plus de EXTRACT_RANGE_PAGES pages est extrait par tranches
+    (pdftotext -f/-l) en parallèle ; les tranches déjà extraites sont
+    lisibles via page_text() avant la fin de l'extraction.
+    """
+
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        self.content_hash = None
+        self.fingerprint = None
+        self.page_count = None
+        self._pages = None
+        self._partial = {}
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._pages is not None
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def extracted_pages(self):
+        """Nombre de pages disponibles (toutes une fois l'extraction terminée)"""
+        return len(self._pages if self._pages is not None else self._partial)
+
+    def get_pages(self, on_range=None):
+        """
+        Retourne les pages du PDF
+
+        Args:
+            on_range: Fonction appelée avec chaque tranche de pages {numéro:
+                texte}, dans l'ordre des pages, au fil de l'extraction (rien
+                n'est appelé si les pages sont relues du cache ou déjà chargées)
+
+        Returns:
+            Mapping en lecture seule {numéro de page: texte} (MappedPages,
+            lu à la demande) ou None si l'extraction échoue ou si le store
+            est fermé
+        """
+        if self._pages is not None:
+            return self._pages
+
+        with self._lock:
+            # Une autre session a pu terminer l'extraction pendant l'attente ;
+            # un store fermé n'extrait plus : le PDF sur disque n'est plus
+            # celui de son empreinte
+            if self._pages is None and not self._closed:
+                pages = self._extract(on_range)
+                if isinstance(pages, dict):
+                    pages = MappingProxyType(pages)
+                self._pages = pages
+                # Une lecture concurrente de page_text() trouve toujours les pages
+                self._partial = self._pages or {}
+
+        return self._pages
+
+    def page_text(self, page):
+        """
+        Texte d'une page, y compris pendant l'extraction si sa tranche est
+        prête (sinon les pages sont chargées, ou l'extraction attendue)
+        """
+        pages = self._pages
+        if pages is None:
+            partial = self._partial
+            if page in partial:
+                return partial[page]
+            pages = self.get_pages()
+            if pages is None:
+                raise KeyError(page)
+        return pages[page]
+
+    def close(self):
+        """
+        Libère le mmap des pages d'un store remplacé
+
+        À n'appeler que lorsque plus aucune version publiée du corpus ne lit
+        ce store (voir Corpus._reindex) : ses pages ne sont plus lisibles
+        ensuite, et ne sont jamais réextraites.
+        """
+        with self._lock:
+            pages = self._pages
+            self._pages = None
+            self._partial = {}
+            self._closed = True
+        if isinstance(pages, MappedPages):
+            pages.close()
+
+    def identify(self):
+        """
+        Empreinte du PDF, calculée sans extraire les pages
+
+        Returns:
+            str: SHA-256 du fichier, ou None s'il est introuvable
+        """
+        if self.fingerprint is None and self.pdf_path and os.path.exists(self.pdf_path):
+            try:
+                self.fingerprint = file_fingerprint(self.pdf_path)
+            except OSError:
+                return None
+            self.content_hash = self.fingerprint['sha256']
+        return self.content_hash
+
+    def is_stale(self):
+        """
+        Le fichier a-t-il changé (taille ou date) depuis sa lecture ?
+
+        Un store dont le fichier n'a pas encore été lu n'est jamais périmé :
+        il lira la version courante.
+        """
+        if self.fingerprint is None:
+            return False
+        try:
+            stat = os.stat(self.pdf_path)
+        except OSError:
+            return True
+        return (stat.st_size, stat.st_mtime_ns) != (self.fingerprint['size'], self.fingerprint['mtime'])
+
+    def _extract(self, on_range=None):
+        """Charge les pages depuis le cache disque, ou extrait le PDF si besoin"""
+        if self.identify() is None:
+            return None
+
+        path = cache_path('pages', self.content_hash, '.pages')
+        pages = open_pages_file(path)
+        if pages is not None:
+            return pages
+
+        pages = self._run_pdftotext(on_range)
+        if pages is None:
+            return None
+
+        # Relu en mmap : le texte complet ne reste pas en mémoire (si le
+        # cache n'est pas accessible en écriture, les pages restent en mémoire)
+        try:
+            write_pages_file(path, pages)
+        except OSError:
+            return pages
+        return open_pages_file(path) or pages
+
+    @timed('extract')
+    def _run_pdftotext(self, on_range=None):
+        """
+        Extrait le PDF page par page avec pdftotext
+
+        Les tranches de pages sont extraites par EXTRACT_WORKERS processus
+        pdftotext simultanés et transmises à `on_range` dans l'ordre des
+        pages, dès que chacune est prête.
+        """
+        self.page_count = pdf_page_count(self.pdf_path)
+        if not self.page_count or self.page_count <= EXTRACT_RANGE_PAGES:
+            pages = self._pdftotext_range()
+            if pages is not None:
+                self._partial.update(pages)
+                if on_range:
+                    on_range(pages)
+            return pages
+
+        ranges = [
+            (first, min(first + EXTRACT_RANGE_PAGES - 1, self.page_count))
+            for first in range(1, self.page_count + 1, EXTRACT_RANGE_PAGES)
+        ]
+
+        pages = {}
+        with ThreadPoolExecutor(max_workers=max(1, EXTRACT_WORKERS), thread_name_prefix='kaizen-pdftotext') as pool:
+            futures = [pool.submit(self._pdftotext_range, first, last) for first, last in ranges]
+            for future in futures:
+                chunk = future.result()
+                if chunk is None:
+                    for pending in futures:
+                        pending.cancel()
+                    return None
+                pages.update(chunk)
+                self._partial.update(chunk)
+                if on_range:
+                    on_range(chunk)
+
+        return pages
+
+    def _pdftotext_range(self, first=None, last=None):
+        """
+        Pages first à last du PDF (tout le document par défaut)
+
+        Returns:
+            dict {numéro de page: texte} sans les pages vides, ou None si
+            pdftotext échoue
+        """
+        command = ['pdftotext', '-layout']
+        if first is not None:
+            command += ['-f', str(first), '-l', str(last)]
+        try:
+            result = subprocess.run(
+                command + [self.pdf_path, '-'],
+                capture_output=True, text=True, check=True
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+        pages = {}
+        for i, page_text in enumerate(result.stdout.split('\f'), first or 1):
+            if page_text.strip():
+                pages[i] = page_text.strip()
+
+        return pages
+
+
+# Registre des stores du processus (un par fichier PDF)
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_page_store(pdf_path):
+    """
+    Retourne le store partagé associé à un PDF
+
+    Args:
+        pdf_path: Chemin du PDF (None si le manuel est introuvable)
+
+    Returns:
+        PageStore: Instance unique pour ce chemin dans le processus (un
+        store fermé, d'un document retiré puis remis, est remplacé)
+    """
+    key = os.path.abspath(pdf_path) if pdf_path else None
+
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None or store.closed:
+            store = PageStore(pdf_path)
+            _stores[key] = store
+
+    return store
+
+
+def replace_page_store(pdf_path):
+    """
+    Remplace le store d'un PDF modifié par un store neuf, lu à la prochaine
+    demande (l'ancien sert encore les versions du corpus déjà publiées :
+    c'est à l'appelant de le fermer quand plus aucune ne le lit)
+
+    Returns:
+        PageStore: Nouvelle instance partagée pour ce chemin
+    """
+    key = os.path.abspath(pdf_path) if pdf_path else None
+
+    with _stores_lock:
+        store = PageStore(pdf_path)
+        _stores[key] = store
+
+    return store
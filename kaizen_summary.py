@@ -0,0 +1,132 @@
+"""
+Résumé extractif des passages retrouvés
+Toutes les phrases des passages sont candidates (pas de limite de lignes) ;
+elles sont représentées par une matrice TF-IDF (termes normalisés de
+kaizen_text) et notées en une passe matricielle :
+
+    pertinence = QUERY_WEIGHT × cos(phrase, question)
+               + (1 − QUERY_WEIGHT) × cos(phrase, centroïde des passages)
+
+puis retenues par MMR (maximal marginal relevance) pour éviter les phrases
+redondantes, et rendues dans l'ordre du document. Pour les 5 passages d'une
+recherche (quelques dizaines de phrases), le résumé prend environ une
+milliseconde.
+
+numpy n'est chargé qu'au premier résumé.
+"""
+
+import re
+
+from kaizen_passages import is_heading
+from kaizen_text import analyze, analyze_query
+
+SUMMARY_SENTENCES = 8
+MIN_SENTENCE_CHARS = 30
+
+# Pertinence : part de la question (le reste : centroïde des passages)
+QUERY_WEIGHT = 0.7
+# MMR : part de la pertinence (le reste : pénalité de redondance)
+MMR_LAMBDA = 0.5
+
+PARAGRAPH_RE = re.compile(r'\n\s*\n')
+# Fin de phrase (pas après un numéro : '2. Cliquer...')
+SENTENCE_RE = re.compile(r'(?<=[^\d\s][.!?])\s+')
+# Début d'un nouvel élément : puce, étape numérotée
+ITEM_RE = re.compile(r'^(?:[-•▪●*]\s|\d+[.)]\s|Étape\s+\d+)', re.IGNORECASE)
+
+
+def split_sentences(text):
+    """
+    Phrases candidates d'un texte
+
+    Les lignes coupées par l'extraction PDF sont recollées dans leur
+    paragraphe ; puces et étapes restent des éléments séparés, les titres
+    sont écartés.
+
+    Returns:
+        list: Phrases d'au moins MIN_SENTENCE_CHARS caractères, sans doublon,
+        dans l'ordre du texte
+    """
+    sentences = []
+    for block in PARAGRAPH_RE.split(text):
+        items = []
+        for line in block.split('\n'):
+            line = ' '.join(line.split())
+            if not line:
+                continue
+            if items and not ITEM_RE.match(line) and not is_heading(line) and not is_heading(items[-1]):
+                items[-1] += ' ' + line
+            else:
+                items.append(line)
+        for item in items:
+            if not is_heading(item):
+                sentences.extend(s for s in SENTENCE_RE.split(item) if len(s) > MIN_SENTENCE_CHARS)
+    return list(dict.fromkeys(sentences))
+
+
+def _normalize(matrix):
+    import numpy as np
+
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def summarize(text, query, limit=SUMMARY_SENTENCES):
+    """
+    Phrases du texte qui répondent le mieux à la question
+
+    Args:
+        text: Passages retrouvés (concaténés)
+        query: Question de l'utilisateur
+        limit: Nombre maximum de phrases
+
+    Returns:
+        list: Phrases retenues dans l'ordre du texte ; vide si aucune
+        phrase ne contient de terme de la question
+    """
+    sentences = split_sentences(text)
+    query_terms = set(analyze_query(query))
+    if not sentences or not query_terms:
+        return []
+
+    import numpy as np
+
+    # Matrice des fréquences (phrases × termes)
+    terms = [analyze(sentence) for sentence in sentences]
+    vocabulary = {}
+    columns = [vocabulary.setdefault(term, len(vocabulary)) for sentence_terms in terms for term in sentence_terms]
+    if not vocabulary:
+        return []
+    rows = np.repeat(np.arange(len(sentences)), [len(sentence_terms) for sentence_terms in terms])
+    tf = np.zeros((len(sentences), len(vocabulary)), dtype=np.float32)
+    np.add.at(tf, (rows, columns), 1)
+
+    # TF-IDF (les phrases sont les documents), lignes normées
+    idf = np.log1p(len(sentences) / np.count_nonzero(tf, axis=0)).astype(np.float32)
+    vectors = _normalize(np.log1p(tf) * idf)
+
+    query_vector = np.zeros(len(vocabulary), dtype=np.float32)
+    for term in query_terms:
+        column = vocabulary.get(term)
+        if column is not None:
+            query_vector[column] = idf[column]
+    if not query_vector.any():
+        return []
+
+    query_similarity = vectors @ _normalize(query_vector)
+    centroid_similarity = vectors @ _normalize(vectors.mean(axis=0))
+    relevance = QUERY_WEIGHT * query_similarity + (1 - QUERY_WEIGHT) * centroid_similarity
+
+    # MMR parmi les phrases qui partagent au moins un terme avec la question
+    available = query_similarity > 0
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(len(sentences), dtype=np.float32)
+    selected = []
+    for _ in range(min(limit, int(available.sum()))):
+        scores = np.where(available, MMR_LAMBDA * relevance - (1 - MMR_LAMBDA) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+
+    return [sentences[i] for i in sorted(selected)]
@@ -0,0 +1,110 @@
+"""
+Normalisation du texte français
+Chaîne unique utilisée par l'index (une fois par page) et par les questions
+(une fois par question, avec cache) : minuscules, suppression des accents,
+des élisions et de la ponctuation, mots vides, racinisation légère
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# Élisions en début de mot : l'AICI, d'impôt, qu'est-ce, jusqu'au...
+ELISION_RE = re.compile(r"\b(?:[cdjlmnst]|qu|jusqu|lorsqu|puisqu|quoiqu)'")
+
+# Après suppression des accents, un terme est une suite de lettres ou chiffres
+TERM_RE = re.compile(r"[a-z0-9]+")
+
+# Mots vides (forme sans accents)
+STOP_WORDS = frozenset("""
+a ai aie aient aies ait as au aux avait avais avez avons avoir ayant
+c ce ceci cela celle celles celui ces cet cette ceux chaque comme comment
+d dans de des donc dont du elle elles en encore est et etaient etais etait
+etant ete etes etre eu eux faut il ils je l la le les leur leurs lui m ma
+mais me meme mes moi mon n ne ni nos notre nous on ont ou par pas peut
+peuvent plus pour pourquoi qu quand que quel quelle quelles quels qui quoi
+s sa sans se sera ses si son sont sous sur t ta te tes toi ton tous tout
+toute toutes tu un une vos votre vous y
+""".split())
+
+
+def _build_fold_table():
+    """Table de traduction : caractère accentué → caractère(s) sans accent"""
+    table = {
+        ord('œ'): 'oe', ord('Œ'): 'oe', ord('æ'): 'ae', ord('Æ'): 'ae',
+        ord('’'): "'", ord('‘'): "'", ord('`'): "'",
+    }
+    for code in range(0xC0, 0x250):
+        char = chr(code)
+        base = unicodedata.normalize('NFD', char)[0]
+        if base != char and base.isascii():
+            table[code] = base.lower()
+    return table
+
+
+FOLD_TABLE = _build_fold_table()
+
+
+def fold(text):
+    """Minuscules et suppression des accents"""
+    return text.lower().translate(FOLD_TABLE)
+
+
+@lru_cache(maxsize=65536)
+def stem(term):
+    """
+    Racinisation légère du français
+
+    Retire les marques de pluriel et de féminin et les terminaisons
+    verbales simples : salariés / salarié / salarie → salari,
+    factures / facturer → factur.
+    """
+    if len(term) < 5 or term.isdigit():
+        return term
+
+    if term.endswith('aux'):
+        term = term[:-3] + 'al'
+    elif term[-1] in 'sx':
+        term = term[:-1]
+
+    if term.endswith('r') and len(term) > 4:
+        term = term[:-1]
+    if term.endswith('e') and len(term) > 4:
+        term = term[:-1]
+    if term.endswith('e') and len(term) > 4:
+        term = term[:-1]
+
+    return term
+
+
+def analyze(text):
+    """
+    Termes normalisés d'un texte (mots vides retirés, racinisés)
+
+    Returns:
+        list: Termes dans l'ordre du texte
+    """
+    text = ELISION_RE.sub('', fold(text))
+    return [
+        stem(term)
+        for term in TERM_RE.findall(text)
+        if len(term) > 1 and term not in STOP_WORDS
+    ]
+
+
+@lru_cache(maxsize=4096)
+def analyze_query(query):
+    """Termes normalisés d'une question (résultat mis en cache)"""
+    return tuple(analyze(query))
+
+
+def query_key(query):
+    """
+    Clé de cache d'une question : mêmes mots, sans tenir compte de la casse,
+    des accents, de la ponctuation ni des espaces ('C'est quoi l'AICI ?' et
+    'c est quoi l aici' ont la même clé)
+
+    Les mots vides sont conservés : ils orientent le type de réponse
+    ('comment', 'où', 'c'est quoi').
+    """
+    return ' '.join(TERM_RE.findall(fold(query)))
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Recherche sémantique et hybride dans le corpus Kaizen
+Les passages sont encodés hors ligne par un modèle d'embeddings local (CPU,
+sans réseau) ; la matrice des vecteurs est enregistrée dans le cache disque
+au format .npy et relue en mémoire partagée (mmap) par tous les processus.
+Une question est encodée puis comparée à tous les passages par un seul
+produit matriciel.
+
+Modèle :
+    KAIZEN_EMBEDDING_MODEL=/chemin/vers/un/modele  (sentence-transformers)
+Sans modèle configuré (ou sans sentence-transformers), un encodeur par
+n-grammes de caractères est utilisé : il tolère fautes de frappe et
+variantes de mots, mais ne connaît pas les synonymes.
+
+Le mode hybride lance en parallèle la recherche lexicale (BM25F) et la
+recherche vectorielle sur les mêmes passages, puis fusionne les deux
+classements (reciprocal rank fusion ou moyenne pondérée des scores).
+
+Construction de l'index hors ligne :
+    python kaizen_vectors.py
+"""
+
+import heapq
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from kaizen_ann import DEFAULT_NPROBE, IVFIndex
+from kaizen_index import INDEX_VERSION, INDEX_VERSIONS_KEPT, get_index
+from kaizen_corpus import get_corpus
+from kaizen_metrics import observe
+from kaizen_store import cache_path
+from kaizen_text import analyze
+
+EMBEDDING_MODEL = os.environ.get('KAIZEN_EMBEDDING_MODEL')
+EMBEDDING_BATCH_SIZE = 32
+
+# Au-delà de ce nombre de passages, la recherche passe par l'index IVF approché
+ANN_MIN_VECTORS = int(os.environ.get('KAIZEN_ANN_MIN_VECTORS', 20000))
+# Nouvelle version du corpus : les centroïdes de l'index IVF précédent sont
+# repris tant que le nombre de vecteurs n'a pas varié de plus de cette
+# proportion depuis leur apprentissage, sinon ils sont réappris (k-means)
+ANN_RETRAIN_RATIO = float(os.environ.get('KAIZEN_ANN_RETRAIN_RATIO', 0.5))
+
+# Recherche hybride : fusion par rangs ('rrf') ou par scores ('weighted')
+HYBRID_FUSION = os.environ.get('KAIZEN_HYBRID_FUSION', 'rrf')
+HYBRID_ALPHA = float(os.environ.get('KAIZEN_HYBRID_ALPHA', 0.5))  # poids du lexical
+HYBRID_CANDIDATES = 50  # candidats retenus par chaque recherche avant fusion
+HYBRID_LEXICAL_RANKING = 'bm25f'
+RRF_K = 60
+
+# Encodeur de repli : dimension et tailles de n-grammes
+HASHING_DIM = 512
+HASHING_NGRAMS = (3, 4, 5)
+
+
+class HashingEmbedder:
+    """
+    Encodeur sans modèle : n-grammes de caractères des termes normalisés,
+    projetés par hachage dans un vecteur de dimension fixe
+    """
+
+    name = f"hashing{HASHING_DIM}"
+
+    def __init__(self, dim=HASHING_DIM):
+        self.dim = dim
+
+    def _features(self, text):
+        for term in analyze(text):
+            yield term
+            padded = f"<{term}>"
+            for n in HASHING_NGRAMS:
+                for i in range(len(padded) - n + 1):
+                    yield padded[i:i + n]
+
+    def encode(self, texts):
+        """
+        Encode une liste de textes
+
+        Returns:
+            np.ndarray: Matrice (len(texts), dim) en float32, lignes normées
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode('utf-8'))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Modèle sentence-transformers chargé depuis un dossier local, sur CPU"""
+
+    def __init__(self, model_path):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_path, device='cpu')
+        self.name = 'st-' + os.path.basename(os.path.normpath(model_path))
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        vectors = self.model.encode(
+            list(texts), batch_size=EMBEDDING_BATCH_SIZE,
+            normalize_embeddings=True, convert_to_numpy=True
+        )
+        return vectors.astype(np.float32)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Encodeur du processus : modèle local si configuré, sinon encodeur par hachage"""
+    global _embedder
+
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                embedder = None
+                if EMBEDDING_MODEL and os.path.isdir(EMBEDDING_MODEL):
+                    try:
+                        embedder = SentenceTransformerEmbedder(EMBEDDING_MODEL)
+                    except ImportError:
+                        embedder = None
+                _embedder = embedder or HashingEmbedder()
+
+    return _embedder
+
+
+class VectorIndex:
+    """
+    Vecteurs des passages du corpus (une ligne par identifiant de passage)
+
+    La matrice est relue en mmap : le système partage les pages mémoire
+    entre tous les processus qui utilisent le même fichier. Pour un grand
+    corpus, `ann` (IVFIndex) remplace la comparaison exhaustive.
+    """
+
+    def __init__(self, vectors, embedder, ann=None):
+        self.vectors = vectors
+        self.embedder = embedder
+        self.ann = ann
+        self._encode_query = lru_cache(maxsize=1024)(self._encode_one)
+
+    def _encode_one(self, query):
+        return self.embedder.encode([query])[0]
+
+    def search(self, query, limit=5):
+        """
+        Passages les plus proches d'une question
+
+        Returns:
+            list: [(identifiant de passage, similarité cosinus)]
+        """
+        return self.search_batch([query], limit)[0]
+
+    def search_batch(self, queries, limit=5, nprobe=DEFAULT_NPROBE):
+        """
+        Recherche de plusieurs questions en un seul produit matriciel
+
+        Args:
+            queries: Questions de l'utilisateur
+            limit: Nombre de passages par question
+            nprobe: Listes explorées par l'index approché (rappel / latence)
+
+        Returns:
+            list: Pour chaque question, [(identifiant de passage, similarité)]
+        """
+        if not len(self.vectors):
+            return [[] for _ in queries]
+
+        query_vectors = np.stack([self._encode_query(q) for q in queries])
+        if self.ann is not None:
+            return [
+                [(doc_id, score) for doc_id, score in hits if score > 0]
+                for hits in self.ann.search(query_vectors, limit, nprobe)
+            ]
+
+        scores = query_vectors @ self.vectors.T
+        k = min(limit, scores.shape[1])
+
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append([(int(i), float(row[i])) for i in top if row[i] > 0])
+        return results
+
+
+def build_vectors(passages, corpus, embedder):
+    """Encode des passages du corpus (titre de section + texte)"""
+    texts = [
+        f"{p.heading}\n{corpus.page_text(p.doc, p.page)[p.start:p.end]}"
+        for p in passages
+    ]
+    batches = [
+        embedder.encode(texts[i:i + EMBEDDING_BATCH_SIZE])
+        for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+    ]
+    if not batches:
+        # Document sans passage : même largeur que les vecteurs des autres documents
+        return np.zeros((0, embedder.dim), dtype=np.float32)
+    return np.concatenate(batches).astype(np.float32)
+
+
+# Index vectoriels du processus, un par version du corpus et par encodeur
+_vector_indexes = {}
+_vector_lock = threading.Lock()
+
+
+def _load_vectors(path, rows, dim):
+    """Relit une matrice du cache disque en mmap (None si absente ou d'une autre forme)"""
+    try:
+        vectors = np.load(path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    return vectors if vectors.shape == (rows, dim) else None
+
+
+def _document_vectors(corpus, index, doc, embedder):
+    """
+    Vecteurs des passages d'un document, mis en cache selon le contenu du
+    PDF : après la modification d'un document, seul celui-ci est réencodé
+    """
+    passages = [p for p in index.passages if p.doc == doc.id]
+    kind = f"vectors-{embedder.name}-segment{INDEX_VERSION}"
+    path = cache_path(kind, doc.store.content_hash, '.npy')
+    vectors = _load_vectors(path, len(passages), embedder.dim)
+    if vectors is None:
+        vectors = build_vectors(passages, corpus, embedder)
+        _save_vectors(path, vectors)
+    return vectors
+
+
+def get_vector_index(corpus):
+    """
+    Retourne l'index vectoriel d'une version du corpus
+
+    La matrice du corpus est relue du cache disque si elle existe, sinon
+    elle est assemblée à partir des vecteurs de chaque document (encodés
+    seulement s'ils ne sont pas en cache) puis enregistrée pour les autres
+    processus.
+
+    Returns:
+        VectorIndex ou None si aucun document n'est disponible
+    """
+    index = get_index(corpus)
+    if index is None:
+        return None
+
+    embedder = get_embedder()
+    key = (corpus.content_hash, embedder.name)
+    vector_index = _vector_indexes.get(key)
+    if vector_index is not None:
+        return vector_index
+
+    with _vector_lock:
+        vector_index = _vector_indexes.get(key)
+        if vector_index is None:
+            # Les lignes suivent la numérotation des passages de l'index
+            kind = f"vectors-{embedder.name}-index{INDEX_VERSION}"
+            path = cache_path(kind, corpus.content_hash, '.npy')
+            vectors = _load_vectors(path, len(index.passages), embedder.dim)
+
+            if vectors is None:
+                parts = [
+                    _document_vectors(corpus, index, doc, embedder)
+                    for doc in corpus.available_documents()
+                ]
+                vectors = np.concatenate(parts) if parts else build_vectors([], corpus, embedder)
+                _save_vectors(path, vectors)
+                # Relu en mmap pour partager la mémoire avec les autres processus
+                saved = _load_vectors(path, len(index.passages), embedder.dim)
+                if saved is not None:
+                    vectors = saved
+
+            ann = None
+            if len(vectors) >= ANN_MIN_VECTORS:
+                # Version précédente du corpus avec le même encodeur
+                previous = next(
+                    (vi for (_, name), vi in reversed(_vector_indexes.items())
+                     if name == embedder.name and vi.ann is not None),
+                    None,
+                )
+                ann = _load_or_build_ann(path, vectors, previous)
+
+            vector_index = VectorIndex(vectors, embedder, ann)
+            _vector_indexes[key] = vector_index
+            while len(_vector_indexes) > INDEX_VERSIONS_KEPT:
+                del _vector_indexes[next(iter(_vector_indexes))]
+
+    return vector_index
+
+
+def _extend_ann(previous, vectors):
+    """
+    Index IVF d'une nouvelle matrice de vecteurs à partir de celui d'une
+    version précédente du corpus, sans réapprendre les centroïdes
+
+    Returns:
+        IVFIndex ou None s'il faut réapprendre les centroïdes
+    """
+    old = previous.ann
+    if old.centroids.shape[1] != vectors.shape[1] or not old.trained:
+        return None
+    if abs(len(vectors) - old.trained) > ANN_RETRAIN_RATIO * old.trained:
+        return None
+
+    old_rows = len(previous.vectors)
+    if len(vectors) >= old_rows and np.array_equal(previous.vectors, vectors[:old_rows]):
+        # Documents ajoutés en fin de corpus : seules les nouvelles lignes
+        # sont affectées à leur liste
+        ann = old.copy()
+        ann.add(vectors[old_rows:], np.arange(old_rows, len(vectors)))
+    else:
+        # Lignes renumérotées (document modifié, inséré ou retiré) : mêmes
+        # centroïdes, toutes les lignes sont réaffectées
+        ann = IVFIndex(old.centroids, trained=old.trained)
+        ann.add(vectors)
+    ann.compact()
+    return ann
+
+
+def _load_or_build_ann(vectors_path, vectors, previous=None):
+    """
+    Relit l'index IVF associé à une matrice de vecteurs, ou le construit
+
+    Args:
+        previous: VectorIndex d'une version précédente du corpus, dont les
+            centroïdes sont repris s'ils restent valables (voir _extend_ann)
+    """
+    ann_dir = vectors_path[:-len('.npy')] + '.ivf' if vectors_path else None
+    ann = IVFIndex.load(ann_dir) if ann_dir else None
+    if ann is not None and len(ann) == len(vectors):
+        return ann
+
+    ann = _extend_ann(previous, vectors) if previous is not None else None
+    if ann is None:
+        ann = IVFIndex.build(vectors)
+    if ann_dir:
+        try:
+            ann.save(ann_dir)
+        except OSError:
+            pass
+    return ann
+
+
+def _save_vectors(path, vectors):
+    """Enregistre la matrice via un fichier temporaire (les erreurs sont ignorées)"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, vectors)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def search_semantic(corpus, query, limit=5):
+    """
+    Passages sémantiquement les plus proches d'une question
+
+    Returns:
+        list: [(identifiant de passage, similarité)]
+    """
+    vector_index = get_vector_index(corpus)
+    if vector_index is None:
+        return []
+    return vector_index.search(query, limit)
+
+
+# Les deux recherches d'une requête hybride s'exécutent en parallèle ;
+# le produit matriciel numpy libère le GIL
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='kaizen-hybrid')
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def fuse_rrf(rankings, limit):
+    """
+    Reciprocal rank fusion : chaque classement apporte 1 / (RRF_K + rang)
+
+    Args:
+        rankings: Listes de [(identifiant de passage, score)] triées
+
+    Returns:
+        list: [(identifiant de passage, score fusionné)] triés
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0) + 1 / (RRF_K + rank)
+    return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+def fuse_weighted(lexical, vector, limit, alpha=HYBRID_ALPHA):
+    """
+    Moyenne pondérée des scores normalisés (min-max) de chaque classement
+
+    Returns:
+        list: [(identifiant de passage, score fusionné)] triés
+    """
+    scores = {}
+    for weight, ranking in ((alpha, lexical), (1 - alpha, vector)):
+        if not ranking:
+            continue
+        values = [score for _, score in ranking]
+        low, high = min(values), max(values)
+        spread = (high - low) or 1.0
+        for doc_id, score in ranking:
+            scores[doc_id] = scores.get(doc_id, 0) + weight * (score - low) / spread
+    return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+def search_hybrid(corpus, query, limit=5, fusion=HYBRID_FUSION, timings=None):
+    """
+    Recherche lexicale et vectorielle en parallèle, puis fusion des classements
+
+    Args:
+        corpus: CorpusVersion (voir kaizen_corpus)
+        query: Question de l'utilisateur
+        limit: Nombre de passages retournés
+        fusion: 'rrf' ou 'weighted'
+        timings: Dictionnaire complété avec la durée de chaque étape (ms)
+
+    Returns:
+        list: [(identifiant de passage, score fusionné)]
+    """
+    if fusion not in ('rrf', 'weighted'):
+        raise ValueError(f"Mode de fusion inconnu : {fusion}")
+
+    index = get_index(corpus)
+    vector_index = get_vector_index(corpus)
+    if index is None or vector_index is None:
+        return []
+
+    candidates = max(limit, HYBRID_CANDIDATES)
+    lexical_future = _executor.submit(_timed, index.search, query, candidates, HYBRID_LEXICAL_RANKING)
+    vector_future = _executor.submit(_timed, vector_index.search, query, candidates)
+    lexical, lexical_ms = lexical_future.result()
+    vector, vector_ms = vector_future.result()
+
+    start = time.perf_counter()
+    if fusion == 'rrf':
+        hits = fuse_rrf([lexical, vector], limit)
+    else:
+        hits = fuse_weighted(lexical, vector, limit)
+    fusion_ms = (time.perf_counter() - start) * 1000
+
+    for stage, ms in (('lexical', lexical_ms), ('vector', vector_ms), ('fusion', fusion_ms)):
+        observe(f"search_{stage}", ms / 1000)
+    if timings is not None:
+        timings.update({'lexical_ms': lexical_ms, 'vector_ms': vector_ms, 'fusion_ms': fusion_ms})
+
+    return hits
+
+
+if __name__ == "__main__":
+    vector_index = get_vector_index(get_corpus().current)
+    if vector_index is None:
+        print("❌ Aucun document du corpus n'est disponible")
+    else:
+        rows, dim = vector_index.vectors.shape
+        print(f"✅ Index vectoriel prêt : {rows} passages, dimension {dim} ({get_embedder().name})")
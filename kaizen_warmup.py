@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Préchauffage et sonde de disponibilité de l'assistant Kaizen
+Au démarrage du serveur, avant la première session : extraction des
+documents, index, automate des concepts (et index vectoriel si le mode de
+classement l'utilise, modèle de génération locale s'il est configuré), pour
+que le premier utilisateur n'attende pas.
+
+Une sonde HTTP légère (serveur de la bibliothèque standard, dans un thread)
+permet au répartiteur de charge de n'envoyer du trafic qu'aux instances
+prêtes :
+    GET /healthz  → 200 tant que le processus répond
+    GET /readyz   → 200 si l'index est prêt, 503 sinon ; JSON avec l'état,
+                    l'empreinte du corpus et les durées de chargement
+    GET /metrics  → durées des étapes et compteurs au format Prometheus
+                    (KAIZEN_METRICS=1, voir kaizen_metrics)
+
+Lancement (préchauffage puis Streamlit dans le même processus) :
+    python kaizen_warmup.py kaizen_assistant.py [options streamlit...]
+Préchauffage seul (construit les caches disque puis s'arrête) :
+    python kaizen_warmup.py
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import kaizen_index
+import kaizen_llm
+import kaizen_metrics
+from kaizen_concepts import get_concept_registry
+from kaizen_corpus import get_corpus
+
+# Port de la sonde (vide ou 0 : pas de sonde)
+HEALTH_PORT = int(os.environ.get('KAIZEN_HEALTH_PORT', 8510) or 0)
+HEALTH_HOST = os.environ.get('KAIZEN_HEALTH_HOST', '0.0.0.0')
+
+# État du préchauffage, lu par la sonde
+_state = {
+    'status': 'starting',   # starting → warming → ready (ou error)
+    'started_at': None,
+    'ready_at': None,
+    'timings_ms': {},
+    'error': None,
+}
+_started = False
+_start_lock = threading.Lock()
+
+
+def _timed(name, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    _state['timings_ms'][name] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def warm_up():
+    """
+    Charge tout ce dont la première question a besoin
+
+    Returns:
+        dict: État final (voir readiness())
+    """
+    _state['status'] = 'warming'
+    _state['started_at'] = time.time()
+
+    try:
+        corpus = get_corpus().current
+
+        # Extraction et indexation en un seul passage : l'index partiel est
+        # publié au fil des tranches, une question posée pendant le
+        # préchauffage obtient déjà une réponse. Durée par document relevée
+        # au fil de la construction.
+        last = [time.perf_counter()]
+
+        def on_segment(doc_id):
+            now = time.perf_counter()
+            _state['timings_ms'][f"pages:{doc_id}"] = round((now - last[0]) * 1000, 1)
+            last[0] = now
+
+        _timed('index', kaizen_index.get_index, corpus, True, on_segment)
+        _timed('concepts', lambda: get_concept_registry().matcher)
+
+        if kaizen_index.DEFAULT_RANKING in ('semantic', 'hybrid'):
+            from kaizen_vectors import get_vector_index
+            _timed('vectors', get_vector_index, corpus)
+        if kaizen_llm.available():
+            _timed('llm', kaizen_llm.get_model_pool().preload)
+    except Exception as e:  # la sonde doit rapporter l'échec plutôt que mourir
+        _state['status'] = 'error'
+        _state['error'] = f"{type(e).__name__}: {e}"
+        return readiness()
+
+    _state['status'] = 'ready'
+    _state['ready_at'] = time.time()
+    return readiness()
+
+
+def readiness():
+    """
+    État de disponibilité de l'instance
+
+    Prête = préchauffage terminé et index de la version courante du corpus
+    construit (pendant une réindexation en arrière-plan, l'ancienne
+    version répond : l'instance reste prête).
+
+    Returns:
+        dict: {'ready', 'status', 'corpus_hash', 'documents', 'reindexing',
+        'timings_ms', 'uptime_s', 'error'}
+    """
+    corpus = get_corpus()
+    version = corpus.current
+    ready = _state['status'] == 'ready' and kaizen_index.index_ready(version)
+    started_at = _state['started_at']
+
+    return {
+        'ready': ready,
+        'status': _state['status'],
+        'corpus_hash': version.content_hash,
+        'documents': [
+            {'id': doc.id, 'label': doc.label, 'pages': doc.store.extracted_pages}
+            for doc in version.documents
+        ],
+        'reindexing': corpus.reindexing,
+        'timings_ms': dict(_state['timings_ms']),
+        'uptime_s': round(time.time() - started_at, 1) if started_at else 0,
+        'error': _state['error'],
+    }
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    """Sonde /healthz (vivant) et /readyz (prêt), mesures /metrics"""
+
+    def do_GET(self):
+        if self.path == '/healthz':
+            self._send(200, {'status': 'alive'})
+        elif self.path == '/readyz':
+            state = readiness()
+            self._send(200 if state['ready'] else 503, state)
+        elif self.path == '/metrics':
+            self._send_text(200, kaizen_metrics.render_prometheus(), kaizen_metrics.CONTENT_TYPE)
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def _send(self, code, payload):
+        self._send_text(code, json.dumps(payload, ensure_ascii=False), 'application/json; charset=utf-8')
+
+    def _send_text(self, code, text, content_type):
+        body = text.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Les sondes sont appelées toutes les quelques secondes : pas de journal
+        pass
+
+
+def start_health_server(port=HEALTH_PORT, host=HEALTH_HOST):
+    """
+    Démarre la sonde dans un thread
+
+    Returns:
+        ThreadingHTTPServer ou None (sonde désactivée ou port occupé)
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), HealthHandler)
+    except OSError as e:
+        print(f"⚠️ Sonde de disponibilité non démarrée sur le port {port} : {e}", file=sys.stderr)
+        return None
+
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='kaizen-health', daemon=True).start()
+    return server
+
+
+def start(health_server=True):
+    """
+    Lance la sonde et le préchauffage en arrière-plan (une seule fois par
+    processus ; les appels suivants ne font rien)
+
+    Args:
+        health_server: False si l'application sert elle-même /readyz
+    """
+    global _started
+
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+
+    if health_server:
+        start_health_server()
+    threading.Thread(target=warm_up, name='kaizen-warmup', daemon=True).start()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        state = warm_up()
+        print(json.dumps(state, ensure_ascii=False, indent=2))
+        sys.exit(0 if state['ready'] else 1)
+
+    # Préchauffage et sonde dans ce processus, puis Streamlit : l'application
+    # réutilise les index déjà chargés. L'état doit être celui du module
+    # importé par l'application, pas celui de __main__.
+    import kaizen_warmup
+    kaizen_warmup.start()
+    from streamlit.web import cli as streamlit_cli
+    sys.argv = ['streamlit', 'run'] + sys.argv[1:]
+    sys.exit(streamlit_cli.main())
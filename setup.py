@@ -34,6 +34,9 @@ def check_dependencies():
     dependencies = {
         'streamlit': 'Streamlit (interface web)',
         'requests': 'Requests (API HTTP)',
+        'numpy': 'NumPy (résumé des passages, recherche sémantique)',
+        'fastapi': 'FastAPI (API HTTP/JSON)',
+        'uvicorn': 'Uvicorn (serveur de l\'API)',
     }
     
     missing = []